@@ -1,6 +1,8 @@
+import asyncio
 import logging
 import os
 import re
+import time
 
 # Пытаемся импортировать Google Gemini
 try:
@@ -12,6 +14,9 @@ except ImportError:
     print("⚠️ Google Gemini недоступен - используется fallback анализ")
 
 import config
+from rewrite_cache import RewriteCache
+from skill_taxonomy import SKILL_TAXONOMY
+from vacancy_cache import VacancyCache
 
 
 class AIAnalyzer:
@@ -21,6 +26,10 @@ class AIAnalyzer:
         self.model_candidates = []
         self.model_index = 0
         self.logger = logging.getLogger(__name__)
+        self.request_timeout = config.AI_REQUEST_TIMEOUT
+        self._semaphore = None
+        self.rewrite_cache = RewriteCache()
+        self.vacancy_cache = VacancyCache()
 
         if GEMINI_AVAILABLE and config.GOOGLE_API_KEY:
             try:
@@ -68,14 +77,67 @@ class AIAnalyzer:
     def extract_keywords_from_vacancy(self, vacancy_text):
         """Извлечение ключевых слов из вакансии"""
         if self.model:
+            cached = self._cached_keywords(vacancy_text)
+            if cached:
+                return cached
             try:
-                return self._gemini_extraction(vacancy_text)
+                started = time.monotonic()
+                keywords = self._gemini_extraction(vacancy_text)
             except Exception as e:
                 print(f"Ошибка Gemini API: {e}")
                 return self._fallback_extraction(vacancy_text)
+            # Кэшируется только разобранный ответ модели, не fallback
+            if keywords is None:
+                return self._fallback_extraction(vacancy_text)
+            self.vacancy_cache.put_keywords(vacancy_text, self.model_name, keywords, time.monotonic() - started)
+            return keywords
         else:
             return self._fallback_extraction(vacancy_text)
 
+    async def extract_keywords_from_vacancy_async(self, vacancy_text, timeout=None):
+        """Асинхронное извлечение ключевых слов (не блокирует event loop)"""
+        if not self.model:
+            return self._fallback_extraction(vacancy_text)
+
+        cached = self._cached_keywords(vacancy_text)
+        if cached:
+            return cached
+        try:
+            started = time.monotonic()
+            text = await self._generate_async(self._extraction_prompt(vacancy_text), timeout)
+            keywords = self._parse_ai_response(text, vacancy_text)
+        except asyncio.TimeoutError:
+            self.logger.warning("⚠️ Gemini не ответил за %s c, используем fallback", timeout or self.request_timeout)
+            return self._fallback_extraction(vacancy_text)
+        except Exception as e:
+            print(f"Ошибка Gemini API: {e}")
+            return self._fallback_extraction(vacancy_text)
+        # Fallback (таймаут, ошибка API, нераспознанный ответ) не кэшируется - только ответ модели
+        if keywords is None:
+            return self._fallback_extraction(vacancy_text)
+        self.vacancy_cache.put_keywords(vacancy_text, self.model_name, keywords, time.monotonic() - started)
+        return keywords
+
+    def _cached_keywords(self, vacancy_text):
+        """Ключевые слова из кэша: точное совпадение текста или почти дубликат вакансии"""
+        cached = self.vacancy_cache.get_keywords(vacancy_text, self.model_name)
+        if cached:
+            return cached
+
+        similar, score = self.vacancy_cache.get_similar_keywords(vacancy_text)
+        if not similar:
+            return None
+        # Копия вакансии может отличаться: оставляем только то, что есть в новом тексте
+        mentioned = set(SKILL_TAXONOMY.find(vacancy_text))
+        verified = {
+            section: [skill for skill in skills if self._verify_in_text(skill, vacancy_text, mentioned)]
+            for section, skills in similar.items()
+        }
+        if not any(verified.values()):
+            return None
+        self.logger.info("♻️ Вакансия похожа на разобранную ранее (%.2f), Gemini не вызываем", score)
+        return verified
+
     def improve_user_text(self, text, field_key=''):
         """Переформулировка пользовательского текста для резюме без выдумывания фактов"""
         raw_text = (text or '').strip()
@@ -85,7 +147,49 @@ class AIAnalyzer:
         if not self.model:
             return self._fallback_rephrase(raw_text, field_key)
 
-        prompt = f"""Ты — редактор резюме. Улучши формулировку текста для раздела "{field_key}".
+        key = RewriteCache.make_key(field_key, raw_text, self.model_name)
+        cached = self.rewrite_cache.get(key)
+        if cached:
+            return cached
+
+        try:
+            started = time.monotonic()
+            rewritten = self._generate(self._rewrite_prompt(raw_text, field_key)).strip()
+            if rewritten:
+                self.rewrite_cache.put(key, rewritten, time.monotonic() - started)
+                return rewritten
+        except Exception as e:
+            self.logger.warning("⚠️ Не удалось переформулировать текст через Gemini: %s", e)
+        return self._fallback_rephrase(raw_text, field_key)
+
+    async def improve_user_text_async(self, text, field_key='', timeout=None):
+        """Асинхронная переформулировка с ограничением параллелизма и дедлайном"""
+        raw_text = (text or '').strip()
+        if not raw_text:
+            return text
+
+        if not self.model:
+            return self._fallback_rephrase(raw_text, field_key)
+
+        key = RewriteCache.make_key(field_key, raw_text, self.model_name)
+        cached = self.rewrite_cache.get(key)
+        if cached:
+            return cached
+
+        try:
+            started = time.monotonic()
+            rewritten = (await self._generate_async(self._rewrite_prompt(raw_text, field_key), timeout)).strip()
+            if rewritten:
+                self.rewrite_cache.put(key, rewritten, time.monotonic() - started)
+                return rewritten
+        except asyncio.TimeoutError:
+            self.logger.warning("⚠️ Gemini не ответил за %s c, оставляем текст без AI", timeout or self.request_timeout)
+        except Exception as e:
+            self.logger.warning("⚠️ Не удалось переформулировать текст через Gemini: %s", e)
+        return self._fallback_rephrase(raw_text, field_key)
+
+    def _rewrite_prompt(self, raw_text, field_key):
+        return f"""Ты — редактор резюме. Улучши формулировку текста для раздела "{field_key}".
 
 Правила:
 - Не выдумывай факты, цифры, компании и технологии.
@@ -97,25 +201,6 @@ class AIAnalyzer:
 Текст:
 {raw_text}"""
 
-        attempts = max(1, len(self.model_candidates))
-        last_error = None
-        for _ in range(attempts):
-            try:
-                response = self.model.generate_content(prompt)
-                rewritten = (getattr(response, 'text', None) or '').strip()
-                if rewritten:
-                    return rewritten
-                return self._fallback_rephrase(raw_text, field_key)
-            except Exception as e:
-                last_error = e
-                if self._should_rotate_model(str(e)) and self._rotate_model(disable_current=True):
-                    continue
-                break
-
-        if last_error:
-            self.logger.warning("⚠️ Не удалось переформулировать текст через Gemini: %s", last_error)
-        return self._fallback_rephrase(raw_text, field_key)
-
     def _fallback_rephrase(self, text, field_key=''):
         """Простая переформулировка без AI"""
         lines = [line.strip() for line in text.split('\n') if line.strip()]
@@ -141,8 +226,12 @@ class AIAnalyzer:
         return cleaned or text
 
     def _gemini_extraction(self, vacancy_text):
-        """Извлечение с помощью Gemini"""
-        prompt = f"""Проанализируй текст вакансии и ТОЧНО выдели упомянутые технологии и навыки.
+        """Извлечение с помощью Gemini; None - ответ не распознан"""
+        text = self._generate(self._extraction_prompt(vacancy_text))
+        return self._parse_ai_response(text, vacancy_text)
+
+    def _extraction_prompt(self, vacancy_text):
+        return f"""Проанализируй текст вакансии и ТОЧНО выдели упомянутые технологии и навыки.
 
 ВАЖНО: 
 - Выписывай ТОЛЬКО те технологии, которые ЯВНО упомянуты в тексте
@@ -166,22 +255,52 @@ SOFT SKILLS:
 - слово1
 - слово2"""
 
+    def _generate(self, prompt):
+        """Запрос к Gemini с переключением модели при 404"""
         attempts = max(1, len(self.model_candidates))
         last_error = None
         for _ in range(attempts):
             try:
                 response = self.model.generate_content(prompt)
-                return self._parse_ai_response(response.text, vacancy_text)
+                return getattr(response, 'text', None) or ''
             except Exception as e:
                 last_error = e
-                error_text = str(e)
-                if self._should_rotate_model(error_text):
-                    if self._rotate_model(disable_current=True):
-                        continue
+                if self._should_rotate_model(str(e)) and self._rotate_model(disable_current=True):
+                    continue
                 raise
         if last_error:
             raise last_error
-        raise RuntimeError("Gemini extraction failed without explicit exception")
+        raise RuntimeError("Gemini request failed without explicit exception")
+
+    async def _generate_async(self, prompt, timeout=None):
+        """Асинхронный запрос к Gemini: общий лимит параллелизма и жесткий дедлайн.
+
+        Дедлайн покрывает ожидание слота семафора и все попытки с ротацией
+        модели; при отмене вызывающей задачи запрос прерывается.
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(config.AI_MAX_CONCURRENCY)
+        return await asyncio.wait_for(
+            self._generate_with_rotation_async(prompt),
+            timeout or self.request_timeout
+        )
+
+    async def _generate_with_rotation_async(self, prompt):
+        attempts = max(1, len(self.model_candidates))
+        last_error = None
+        for _ in range(attempts):
+            try:
+                async with self._semaphore:
+                    response = await self.model.generate_content_async(prompt)
+                return getattr(response, 'text', None) or ''
+            except Exception as e:
+                last_error = e
+                if self._should_rotate_model(str(e)) and self._rotate_model(disable_current=True):
+                    continue
+                raise
+        if last_error:
+            raise last_error
+        raise RuntimeError("Gemini request failed without explicit exception")
 
     def _should_rotate_model(self, error_text):
         return 'not found' in error_text.lower() or '404' in error_text
@@ -231,13 +350,14 @@ SOFT SKILLS:
             return []
 
     def _parse_ai_response(self, text, original_vacancy):
-        """Парсинг ответа AI с проверкой"""
+        """Парсинг ответа AI с проверкой; None, если навыков в ответе не нашлось"""
         result = {
             'technical': [],
             'soft': [],
             'keywords': []
         }
 
+        mentioned = set(SKILL_TAXONOMY.find(original_vacancy))
         current_section = None
         for line in text.split('\n'):
             line = line.strip()
@@ -249,101 +369,42 @@ SOFT SKILLS:
                 current_section = 'keywords'
             elif line.startswith('-') and current_section:
                 skill = line[1:].strip()
-                if skill and self._verify_in_text(skill, original_vacancy):
-                    result[current_section].append(skill)
+                if skill and self._verify_in_text(skill, original_vacancy, mentioned):
+                    skill = SKILL_TAXONOMY.canonical(skill) or skill
+                    if skill not in result[current_section]:
+                        result[current_section].append(skill)
 
-        # Если не распарсилось - используем fallback
+        # Не распарсилось - fallback вызывает вызывающий код, мимо кэша
         if not any(result.values()):
-            return self._fallback_extraction(original_vacancy)
+            return None
 
         return result
 
-    def _verify_in_text(self, skill, text):
-        """Проверка что навык действительно есть в тексте"""
-        return skill.lower() in text.lower()
+    def _verify_in_text(self, skill, text, mentioned=None):
+        """Проверка что навык действительно есть в тексте.
+
+        Навык из словаря засчитывается, если в тексте есть любой его вариант
+        написания (целым словом); mentioned - заранее найденные навыки текста.
+        Остальное проверяется поиском подстроки.
+        """
+        canonical = SKILL_TAXONOMY.canonical(skill)
+        if canonical is None:
+            return skill.lower() in text.lower()
+        if mentioned is None:
+            mentioned = SKILL_TAXONOMY.find(text)
+        return canonical in mentioned
 
     def _fallback_extraction(self, text):
         """Улучшенная экстракция без AI"""
-        text_lower = text.lower()
-
         key_skills = self._extract_key_skills(text)
 
-        technical_skills = {
-            # Программирование - ВАЖНО: добавляем варианты написания
-            'Python', 'JavaScript', 'Java', 'C++', 'C\\+\\+', 'Cpp', 'C#', 'C Sharp', 'C',
-            'TypeScript', 'Go', 'Golang', 'Rust',
-            'Ruby', 'PHP', 'Swift', 'Kotlin', 'Scala', 'R', 'MATLAB', 'Dart', 'Lua',
-
-            # Фреймворки
-            'React', 'Vue', 'Angular', 'Django', 'Flask', 'FastAPI', 'Spring',
-            'Node.js', 'Express', 'Next.js', 'Laravel', 'Rails', 'Tokio', 'Actix',
-
-            # Базы данных
-            'PostgreSQL', 'MySQL', 'MongoDB', 'Redis', 'Elasticsearch', 'Clickhouse',
-            'Kafka', 'RabbitMQ', 'MS SQL', 'MSSQL', 'BigQuery', 'SQL', 'NoSQL',
-
-            # DevOps
-            'Docker', 'Kubernetes', 'Git', 'GitLab', 'GitHub', 'Jenkins', 'CI/CD',
-            'AWS', 'Azure', 'GCP', 'Terraform', 'Ansible', 'Linux',
-
-            # Python stack
-            'pandas', 'numpy', 'requests', 'asyncio',
-
-            # Data/ETL
-            'ETL', 'ELT',
-
-            # API
-            'API', 'REST', 'REST API',
-
-            # Shell
-            'bash',
-
-            # Библиотеки
-            'mavsdk', 'opencv', 'OpenCV', 'ardupilot', 'ArduPilot',
-            'Raspberry Pi', 'Orange Pi', 'Nvidia Jetson', 'Jetson',
-
-            # Дизайн
-            'AutoCAD', 'Photoshop', 'Illustrator', 'Figma', 'Sketch', 'Adobe XD',
-
-            # Другое
-            'REST API', 'GraphQL', 'Microservices', 'Machine Learning',
-            'нейронные сети', 'нейросети', 'криптография'
-        }
-
-        # Специальная обработка для C++
-        if 'c++' in text_lower or 'cpp' in text_lower or 'c\\+\\+' in text_lower:
-            found_technical = ['C++']
-        else:
-            found_technical = []
-
-        # Обычный поиск для остальных
-        for skill in technical_skills:
-            if skill == 'C++' or skill == 'C\\+\\+' or skill == 'Cpp':
-                continue  # Уже обработали выше
-
-            # Специальная обработка для однобуквенных (C, R)
-            if skill in ['C', 'R']:
-                # Ищем как отдельное слово
-                pattern = r'\b' + re.escape(skill) + r'\b'
-                if re.search(pattern, text, re.IGNORECASE):
-                    if skill not in found_technical:
-                        found_technical.append(skill)
-            else:
-                pattern = r'\b' + re.escape(skill.lower()) + r'\b'
-                if re.search(pattern, text_lower):
-                    if skill not in found_technical:
-                        found_technical.append(skill)
-
-        # Soft skills
-        soft_skills_list = [
-            'коммуникация', 'работа в команде', 'teamwork',
-            'лидерство', 'leadership', 'problem solving',
-            'параллельные вычисления', 'асинхронные вычисления'
-        ]
-
-        found_soft = [s for s in soft_skills_list if s.lower() in text_lower]
+        # Все навыки словаря (с синонимами) - одним проходом по тексту
+        found = SKILL_TAXONOMY.find(text)
+        found_technical = [name for name in found if SKILL_TAXONOMY.skills[name].category == 'technical']
+        found_soft = [name for name in found if SKILL_TAXONOMY.skills[name].category == 'soft']
 
         if key_skills:
+            key_skills = list(dict.fromkeys(SKILL_TAXONOMY.canonical(ks) or ks for ks in key_skills))
             for ks in key_skills:
                 if ks not in found_technical:
                     found_technical.insert(0, ks)
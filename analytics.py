@@ -0,0 +1,143 @@
+import logging
+import sqlite3
+import threading
+import time
+
+import config
+
+
+class AnalyticsCounters:
+    """Счетчики аналитики, которые обновляются при записи строк в Sheets.
+
+    Хранятся в локальном SQLite, поэтому update_analytics не нужно читать
+    листы Users и Feedback целиком. Полная сверка с таблицей (audit)
+    выполняется редко, раз в ANALYTICS_AUDIT_INTERVAL.
+    """
+
+    TOTALS = ('feedback', 'ratings_sum', 'ratings_count', 'will_use', 'edited', 'quick_edit')
+
+    def __init__(self, path=None, audit_interval=None):
+        self.path = path or config.ANALYTICS_DB_PATH
+        self.audit_interval = audit_interval if audit_interval is not None else config.ANALYTICS_AUDIT_INTERVAL
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS analytics_users (user_id TEXT PRIMARY KEY, status TEXT NOT NULL)'
+        )
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS analytics_totals (key TEXT PRIMARY KEY, value REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def record_user(self, user_id, status):
+        """Учесть запись строки пользователя с данным статусом"""
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT status FROM analytics_users WHERE user_id = ?', (str(user_id),)
+            ).fetchone()
+            if row and row[0] == (status or ''):
+                return
+            self.conn.execute(
+                'INSERT OR REPLACE INTO analytics_users (user_id, status) VALUES (?, ?)',
+                (str(user_id), status or '')
+            )
+            self._add_total('version', 1)
+            self.conn.commit()
+
+    def record_feedback(self, rating, will_use, editing_time, did_edit):
+        """Учесть одну добавленную строку Feedback"""
+        deltas = self._feedback_deltas(rating, will_use, editing_time, did_edit)
+        with self._lock:
+            for key, delta in deltas.items():
+                if delta:
+                    self._add_total(key, delta)
+            self._add_total('version', 1)
+            self.conn.commit()
+
+    def reset(self, users, feedback):
+        """Полная сверка: users - пары (user_id, status), feedback - кортежи
+        (оценка, будет использовать, время редактирования, редактировал)"""
+        totals = dict.fromkeys(self.TOTALS, 0)
+        for row in feedback:
+            for key, delta in self._feedback_deltas(*row).items():
+                totals[key] += delta
+        previous = self._get_totals()
+        with self._lock:
+            self.conn.execute('DELETE FROM analytics_users')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO analytics_users (user_id, status) VALUES (?, ?)',
+                [(str(user_id), status or '') for user_id, status in users]
+            )
+            self.conn.execute('DELETE FROM analytics_totals')
+            self.conn.executemany(
+                'INSERT INTO analytics_totals (key, value) VALUES (?, ?)', list(totals.items())
+            )
+            self._set_total('audited_at', time.time())
+            # Сверка не считается изменением: версии снимков сохраняются
+            for key in ('version', 'snapshot_version'):
+                if key in previous:
+                    self._set_total(key, previous[key])
+            self.conn.commit()
+
+    def needs_audit(self):
+        audited_at = self._get_totals().get('audited_at')
+        return audited_at is None or time.time() - audited_at > self.audit_interval
+
+    def changed_since_snapshot(self):
+        """Были ли записи после последнего снимка в листе Analytics"""
+        totals = self._get_totals()
+        return 'snapshot_version' not in totals or totals.get('version', 0) != totals['snapshot_version']
+
+    def mark_snapshot(self):
+        with self._lock:
+            version = self.conn.execute(
+                "SELECT value FROM analytics_totals WHERE key = 'version'"
+            ).fetchone()
+            self._set_total('snapshot_version', version[0] if version else 0)
+            self.conn.commit()
+
+    def metrics(self):
+        """Итоговые показатели в формате строки листа Analytics"""
+        with self._lock:
+            total_users, completed = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(status = 'completed'), 0) FROM analytics_users"
+            ).fetchone()
+        totals = self._get_totals()
+        ratings_count = totals.get('ratings_count', 0)
+        return {
+            'total_users': total_users,
+            'completed': completed,
+            'conversion': (completed / total_users * 100) if total_users > 0 else 0,
+            'avg_rating': totals.get('ratings_sum', 0) / ratings_count if ratings_count else 0,
+            'will_use': int(totals.get('will_use', 0)),
+            'quick_edit': int(totals.get('quick_edit', 0)),
+            'edited': int(totals.get('edited', 0))
+        }
+
+    def _feedback_deltas(self, rating, will_use, editing_time, did_edit):
+        deltas = dict.fromkeys(self.TOTALS, 0)
+        deltas['feedback'] = 1
+        if isinstance(rating, (int, float)) or (isinstance(rating, str) and rating.isdigit()):
+            deltas['ratings_sum'] = int(rating)
+            deltas['ratings_count'] = 1
+        deltas['will_use'] = int(will_use == 'Да')
+        deltas['edited'] = int(did_edit == 'Да')
+        deltas['quick_edit'] = int('15' in str(editing_time or ''))
+        return deltas
+
+    def _get_totals(self):
+        with self._lock:
+            return dict(self.conn.execute('SELECT key, value FROM analytics_totals').fetchall())
+
+    def _add_total(self, key, delta):
+        self.conn.execute(
+            'INSERT INTO analytics_totals (key, value) VALUES (?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = value + excluded.value',
+            (key, delta)
+        )
+
+    def _set_total(self, key, value):
+        self.conn.execute('INSERT OR REPLACE INTO analytics_totals (key, value) VALUES (?, ?)', (key, value))
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер поиска навыков в _fallback_extraction: цикл, который был в
+ai_analyzer до индекса (отдельный \\b-regex на каждый навык, особый случай
+для C++, подстроки для soft skills), против индекса SkillTaxonomy (один
+проход). Найденное циклом приводится к каноническим именам словаря.
+
+Расхождения печатаются. По написаниям, которые знал цикл, индекс не
+должен находить ничего сверх цикла, кроме C#: после "#" у \\b нет
+границы, и цикл видел в "C#" только "C". Обратное допустимо: индекс
+намеренно не считает навык внутри более длинного ("REST" в "REST API")
+и короткие варианты не в написании словаря ("go", "js").
+"""
+
+import random
+import re
+import sys
+import time
+
+from skill_taxonomy import SKILL_TAXONOMY
+
+VARIANTS = [variant for variant in SKILL_TAXONOMY.index]
+
+# Словари из прежнего _fallback_extraction (без изменений)
+LEGACY_TECHNICAL = {
+    # Программирование - ВАЖНО: добавляем варианты написания
+    'Python', 'JavaScript', 'Java', 'C++', 'C\\+\\+', 'Cpp', 'C#', 'C Sharp', 'C',
+    'TypeScript', 'Go', 'Golang', 'Rust',
+    'Ruby', 'PHP', 'Swift', 'Kotlin', 'Scala', 'R', 'MATLAB', 'Dart', 'Lua',
+
+    # Фреймворки
+    'React', 'Vue', 'Angular', 'Django', 'Flask', 'FastAPI', 'Spring',
+    'Node.js', 'Express', 'Next.js', 'Laravel', 'Rails', 'Tokio', 'Actix',
+
+    # Базы данных
+    'PostgreSQL', 'MySQL', 'MongoDB', 'Redis', 'Elasticsearch', 'Clickhouse',
+    'Kafka', 'RabbitMQ', 'MS SQL', 'MSSQL', 'BigQuery', 'SQL', 'NoSQL',
+
+    # DevOps
+    'Docker', 'Kubernetes', 'Git', 'GitLab', 'GitHub', 'Jenkins', 'CI/CD',
+    'AWS', 'Azure', 'GCP', 'Terraform', 'Ansible', 'Linux',
+
+    # Python stack
+    'pandas', 'numpy', 'requests', 'asyncio',
+
+    # Data/ETL
+    'ETL', 'ELT',
+
+    # API
+    'API', 'REST', 'REST API',
+
+    # Shell
+    'bash',
+
+    # Библиотеки
+    'mavsdk', 'opencv', 'OpenCV', 'ardupilot', 'ArduPilot',
+    'Raspberry Pi', 'Orange Pi', 'Nvidia Jetson', 'Jetson',
+
+    # Дизайн
+    'AutoCAD', 'Photoshop', 'Illustrator', 'Figma', 'Sketch', 'Adobe XD',
+
+    # Другое
+    'REST API', 'GraphQL', 'Microservices', 'Machine Learning',
+    'нейронные сети', 'нейросети', 'криптография'
+}
+
+LEGACY_SOFT = [
+    'коммуникация', 'работа в команде', 'teamwork',
+    'лидерство', 'leadership', 'problem solving',
+    'параллельные вычисления', 'асинхронные вычисления'
+]
+
+# Написания, которые прежний цикл вообще умел находить (новые синонимы
+# словаря, например "микросервисы", при сверке не учитываются)
+LEGACY_SPELLINGS = {skill.lower() for skill in LEGACY_TECHNICAL | set(LEGACY_SOFT)}
+
+SAMPLE = """Backend-разработчик (Python / C++)
+Мы ищем разработчика в команду платформы данных.
+Задачи: сервисы на FastAPI и Django, REST API, интеграции с Kafka и RabbitMQ,
+хранилища PostgreSQL, ClickHouse и MS SQL, деплой в Kubernetes через GitLab CI/CD.
+Будет плюсом: Go или Rust, опыт с R и MATLAB, язык C, Node.js, Next.js, Machine Learning.
+Работа с нейросети и криптография, Raspberry Pi и Nvidia Jetson, opencv.
+Условия: удаленка, ДМС, курсы английского, спортзал, гибкий график.
+"""
+
+
+def legacy_find(text):
+    """Поиск навыков из прежнего _fallback_extraction (без _extract_key_skills)"""
+    text_lower = text.lower()
+
+    # Специальная обработка для C++
+    if 'c++' in text_lower or 'cpp' in text_lower or 'c\\+\\+' in text_lower:
+        found_technical = ['C++']
+    else:
+        found_technical = []
+
+    # Обычный поиск для остальных
+    for skill in LEGACY_TECHNICAL:
+        if skill == 'C++' or skill == 'C\\+\\+' or skill == 'Cpp':
+            continue  # Уже обработали выше
+
+        # Специальная обработка для однобуквенных (C, R)
+        if skill in ['C', 'R']:
+            # Ищем как отдельное слово
+            pattern = r'\b' + re.escape(skill) + r'\b'
+            if re.search(pattern, text, re.IGNORECASE):
+                if skill not in found_technical:
+                    found_technical.append(skill)
+        else:
+            pattern = r'\b' + re.escape(skill.lower()) + r'\b'
+            if re.search(pattern, text_lower):
+                if skill not in found_technical:
+                    found_technical.append(skill)
+
+    found_soft = [s for s in LEGACY_SOFT if s.lower() in text_lower]
+    return found_technical + found_soft
+
+
+def canonical_legacy_find(text):
+    return list(dict.fromkeys(SKILL_TAXONOMY.canonical(skill) or skill for skill in legacy_find(text)))
+
+
+def index_find_legacy_spellings(text):
+    """Навыки, найденные индексом по написаниям из прежнего цикла"""
+    return {
+        skill for start, end, skill in SKILL_TAXONOMY.matcher.find(text)
+        if text[start:end].lower() in LEGACY_SPELLINGS
+    }
+
+
+def explained_extra(skill, text):
+    """Лишнее у индекса, объяснимое ограничением \\b в цикле"""
+    return skill == 'C#' and 'c#' in text.lower()
+
+
+PROSE = """Обязанности: разработка и поддержка сервисов, участие в проектировании
+архитектуры, написание тестов, ревью кода, взаимодействие с аналитиками и
+продуктовой командой. Требования: опыт коммерческой разработки от трех лет,
+понимание принципов работы сетей и баз данных, умение разбираться в чужом коде.
+Мы предлагаем официальное оформление, конкурентную зарплату, обучение за счет
+компании и современный офис рядом с метро.""".split()
+
+# Граничные случаи для \b: навык внутри слова, рядом со знаками и подчеркиванием
+EDGE_CASES = ['c#', 'c++', 'r&d', 'goal', 'restapi', 'api-first', 'java-script', 'ci/cd:',
+              '(sql)', 'nosql,', 'postgres', 'x_c', 'c_', '_r', 'C', 'R,', 'Go.']
+
+
+def make_vacancy(size, seed):
+    """Текст вакансии нужной длины: обычный текст, навыки (~3% слов) и граничные случаи"""
+    rng = random.Random(seed)
+    legacy = sorted(LEGACY_TECHNICAL) + LEGACY_SOFT
+    skills = EDGE_CASES + VARIANTS + legacy + [skill.lower() for skill in legacy]
+    parts = [SAMPLE]
+    length = len(SAMPLE)
+    while length < size:
+        chunk = rng.choice(skills) if rng.random() < 0.03 else rng.choice(PROSE)
+        parts.append(chunk)
+        length += len(chunk) + 1
+    return ' '.join(parts)[:size]
+
+
+def bench(func, text, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = func(text)
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    print(f"Навыков в словаре: {len(SKILL_TAXONOMY.skills)}, вариантов: {len(VARIANTS)}, "
+          f"в прежнем цикле: {len(LEGACY_TECHNICAL) + len(LEGACY_SOFT)}")
+    ok = True
+    for size in (1_000, 5_000, 30_000):
+        for seed in range(3):
+            text = make_vacancy(size, seed)
+            legacy_ms, _ = bench(legacy_find, text, repeat)
+            matcher_ms, found = bench(SKILL_TAXONOMY.find, text, repeat)
+            legacy = set(canonical_legacy_find(text))
+            extra = {
+                skill for skill in index_find_legacy_spellings(text) - legacy
+                if not explained_extra(skill, text)
+            }
+            ok = ok and not extra
+            nested = ', '.join(sorted(legacy - set(found)))
+            print(f"{size:>6} симв. #{seed}: цикл {legacy_ms:7.2f} мс, "
+                  f"индекс {matcher_ms:6.2f} мс, x{legacy_ms / matcher_ms:5.1f} "
+                  f"{'❌ лишние: ' + str(extra) if extra else '✅'}"
+                  f"{' (не засчитаны: ' + nested + ')' if nested else ''}")
+    print("✅ Индекс не находит лишнего" if ok else "❌ Индекс нашел то, чего цикл не находил")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
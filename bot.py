@@ -1,5 +1,6 @@
 import logging
 import asyncio
+import contextlib
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import (
     Application, CommandHandler, MessageHandler, CallbackQueryHandler,
@@ -10,9 +11,14 @@ from telegram.error import BadRequest
 from datetime import datetime
 import config
 from database import Database
+from storage import AsyncDatabase
+from session_store import SessionStore
+from write_behind import WriteBehindQueue
 from latex_generator import LaTeXGenerator
+from render_service import RenderService, RenderQueueFull
 from ai_analyzer import AIAnalyzer
 from keyboards import Keyboards
+from update_processor import PerUserUpdateProcessor
 import io
 import http.server
 import socketserver
@@ -21,6 +27,7 @@ import threading
 import time
 import re
 import html
+import hashlib
 from urllib.request import Request, urlopen
 from urllib.error import URLError, HTTPError
 
@@ -37,74 +44,110 @@ logger = logging.getLogger(__name__)
 
 # Инициализация
 db = Database()
+writer = WriteBehindQueue(db)
+store = AsyncDatabase(db, writer)
 latex_gen = LaTeXGenerator()
+renderer = RenderService(generator=latex_gen)
 ai = AIAnalyzer()
 kb = Keyboards()
 AI_REWRITE_FIELDS = {'responsibilities', 'project_description', 'achievements', 'interests'}
 URL_PATTERN = re.compile(r'https?://[^\s<>"\]\)]+', re.IGNORECASE)
 
 # Хранилище данных
-user_sessions = {}
-
-
-def get_user_session(user_id):
-    """Получить или создать сессию пользователя"""
-    if user_id not in user_sessions:
-        user_sessions[user_id] = {
-            'registration_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
-            'current_section': None,
-            'current_question': 0,
-            'educations': [],
-            'experiences': [],
-            'projects': [],
-            'history': [],
-            'message_ids': []
+user_sessions = SessionStore()
+# Текущие AI-запросы пользователей (user_id -> asyncio.Task)
+ai_tasks = {}
+# Загрузки сессий из Google Sheets (user_id -> asyncio.Task)
+session_loads = {}
+
+
+async def get_user_session(user_id):
+    """Получить или создать сессию пользователя.
+
+    Новая сессия публикуется в хранилище только целиком, после загрузки
+    сохраненных данных; параллельные обработчики одного пользователя ждут
+    одну и ту же загрузку.
+    """
+    session = user_sessions.cached(user_id)
+    if session is not None:
+        return session
+
+    task = session_loads.get(user_id)
+    if task is None:
+        task = asyncio.ensure_future(_load_user_session(user_id))
+        session_loads[user_id] = task
+        task.add_done_callback(lambda _: session_loads.pop(user_id, None))
+    # Отмена одного обработчика не должна прерывать загрузку для остальных
+    return await asyncio.shield(task)
+
+
+async def _load_user_session(user_id):
+    """Собрать сессию из SQLite или из сохраненных данных и положить в хранилище"""
+    session = await asyncio.to_thread(user_sessions.get, user_id)
+    if session is not None:
+        return session
+
+    saved = await store.get_user_data(user_id)
+    session = user_sessions.cached(user_id)
+    if session is not None:
+        return session
+
+    session = {
+        'registration_date': datetime.now().strftime('%Y-%m-%d %H:%M'),
+        'current_section': None,
+        'current_question': 0,
+        'educations': [],
+        'experiences': [],
+        'projects': [],
+        'history': [],
+        'message_ids': []
+    }
+    if saved:
+        mapping = {
+            'ФИО': 'full_name',
+            'Email': 'email',
+            'Телефон': 'phone',
+            'Город': 'location',
+            'LinkedIn': 'linkedin',
+            'GitHub': 'github',
+            'GitLab': 'gitlab',
+            'Portfolio': 'portfolio',
+            'Университет': 'university',
+            'Специальность': 'degree',
+            'Период обучения': 'study_period',
+            'Технические навыки': 'technical_skills',
+            'Soft skills': 'soft_skills',
+            'Достижения': 'achievements',
+            'Языки': 'languages',
+            'Интересы': 'interests',
+            'Текст вакансии': 'vacancy_text',
+            'Ссылка на вакансию': 'vacancy_url',
+            'Выбранный шаблон': 'template',
+            'Дата создания резюме': 'resume_date',
+            'Статус': 'status'
         }
-        saved = db.get_user_data(user_id)
-        if saved:
-            mapping = {
-                'ФИО': 'full_name',
-                'Email': 'email',
-                'Телефон': 'phone',
-                'Город': 'location',
-                'LinkedIn': 'linkedin',
-                'GitHub': 'github',
-                'GitLab': 'gitlab',
-                'Portfolio': 'portfolio',
-                'Университет': 'university',
-                'Специальность': 'degree',
-                'Период обучения': 'study_period',
-                'Технические навыки': 'technical_skills',
-                'Soft skills': 'soft_skills',
-                'Достижения': 'achievements',
-                'Языки': 'languages',
-                'Интересы': 'interests',
-                'Текст вакансии': 'vacancy_text',
-                'Ссылка на вакансию': 'vacancy_url',
-                'Выбранный шаблон': 'template',
-                'Дата создания резюме': 'resume_date',
-                'Статус': 'status'
-            }
-            for src, dst in mapping.items():
-                if src in saved and saved[src]:
-                    user_sessions[user_id][dst] = saved[src]
-            for key in ['educations', 'experiences', 'projects', 'vacancy_keywords']:
-                if key in saved:
-                    user_sessions[user_id][key] = saved[key]
-            if not user_sessions[user_id].get('educations'):
-                if saved.get('Университет') or saved.get('Специальность') or saved.get('Период обучения'):
-                    user_sessions[user_id]['educations'] = [{
-                        'university': saved.get('Университет', ''),
-                        'degree': saved.get('Специальность', ''),
-                        'study_period': saved.get('Период обучения', '')
-                    }]
-            if saved.get('status') == 'completed' and saved.get('resume_date'):
-                user_sessions[user_id]['resumes'] = [{
-                    'date': saved.get('resume_date'),
-                    'name': saved.get('full_name', 'Резюме'),
-                    'template': saved.get('template', 'Modern')
+        for src, dst in mapping.items():
+            if src in saved and saved[src]:
+                session[dst] = saved[src]
+        for key in ['educations', 'experiences', 'projects', 'vacancy_keywords']:
+            if key in saved:
+                session[key] = saved[key]
+        if not session.get('educations'):
+            if saved.get('Университет') or saved.get('Специальность') or saved.get('Период обучения'):
+                session['educations'] = [{
+                    'university': saved.get('Университет', ''),
+                    'degree': saved.get('Специальность', ''),
+                    'study_period': saved.get('Период обучения', '')
                 }]
-    return user_sessions[user_id]
+        if saved.get('status') == 'completed' and saved.get('resume_date'):
+            session['resumes'] = [{
+                'date': saved.get('resume_date'),
+                'name': saved.get('full_name', 'Резюме'),
+                'template': saved.get('template', 'Modern')
+            }]
+    user_sessions.put(user_id, session)
+    return session
+
 
 def _items_key(section_key):
     return section_key if section_key.endswith('s') else section_key + 's'
@@ -212,6 +255,102 @@ def _sync_primary_education_from_list(session):
     session['study_period'] = first.get('study_period', '')
 
 
+async def run_ai_task(user_id, coro):
+    """AI-запрос пользователя; возвращает None, если запрос отменили.
+
+    Новый AI-запрос того же пользователя или /start, /new отменяют предыдущий.
+    """
+    cancel_ai_task(user_id)
+    task = asyncio.create_task(coro)
+    ai_tasks[user_id] = task
+    try:
+        await asyncio.wait({task})
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        if ai_tasks.get(user_id) is task:
+            ai_tasks.pop(user_id, None)
+    if task.cancelled():
+        return None
+    return task.result()
+
+
+def cancel_ai_task(user_id):
+    task = ai_tasks.pop(user_id, None)
+    if task and not task.done():
+        task.cancel()
+
+
+def hold_user_session(update):
+    """Сессия пользователя не вытесняется из памяти, пока идет обработка апдейта"""
+    user = update.effective_user if isinstance(update, Update) else None
+    return user_sessions.in_use(user.id) if user else contextlib.nullcontext()
+
+
+def preempt_ai_task(update):
+    """/start и /new, вставшие в очередь за AI-запросом, отменяют его сразу"""
+    message = update.message
+    text = (message.text or '') if message else ''
+    if update.effective_user and text.split('@')[0].split(' ')[0] in ('/start', '/new'):
+        cancel_ai_task(update.effective_user.id)
+
+
+async def render_resume_pdf(session, backend=None):
+    """Рендер PDF через RenderService.
+
+    backend: 'latex' или 'native'; по умолчанию config.RENDER_BACKEND.
+    При переполненной очереди TeX сервис сам рендерит через native
+    (RENDER_NATIVE_FALLBACK); ошибка и отправка .tex - только если native
+    выключен или недоступен.
+    """
+    try:
+        pdf_data, error = await renderer.render(session, session.get('vacancy_keywords'), backend=backend)
+    except RenderQueueFull as exc:
+        logger.warning("⚠️ Очередь рендера переполнена: %s", exc)
+        return None, "Очередь рендера переполнена"
+    if error:
+        logger.warning("⚠️ PDF не создан (%s), очередь: %s", error, renderer.stats())
+    return pdf_data, error
+
+
+def _known_file_id(session, digest):
+    """file_id уже загруженного в Telegram PDF с тем же содержимым"""
+    for resume in session.get('resumes', []):
+        if resume.get('pdf_sha256') == digest and resume.get('file_id'):
+            return resume['file_id']
+    return None
+
+
+async def send_resume_pdf(message, session, pdf_data, caption, reply_markup=None):
+    """Отправить PDF; если такой файл уже загружался - по file_id, без загрузки.
+
+    Возвращает (sha256 содержимого, file_id) для записи в session['resumes'].
+    """
+    digest = hashlib.sha256(pdf_data).hexdigest()
+    file_id = _known_file_id(session, digest)
+    if file_id:
+        try:
+            await message.reply_document(
+                document=file_id,
+                caption=caption,
+                parse_mode=ParseMode.HTML,
+                reply_markup=reply_markup
+            )
+            return digest, file_id
+        except BadRequest as exc:
+            logger.warning("⚠️ file_id не принят, загружаю PDF заново: %s", exc)
+
+    sent = await message.reply_document(
+        document=pdf_data,
+        filename=f"Resume_{session.get('full_name', 'User').replace(' ', '_')}.pdf",
+        caption=caption,
+        parse_mode=ParseMode.HTML,
+        reply_markup=reply_markup
+    )
+    return digest, sent.document.file_id if sent and sent.document else None
+
+
 async def safe_answer_callback_query(query):
     try:
         await query.answer()
@@ -262,7 +401,8 @@ async def clear_reply_markup_by_message(context, chat_id, message_id):
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало работы"""
     user = update.effective_user
-    session = get_user_session(user.id)
+    cancel_ai_task(user.id)
+    session = await get_user_session(user.id)
     session['username'] = user.username
 
     # Сбрасываем режим редактирования если был
@@ -297,7 +437,7 @@ async def view_resume(update: Update, context: ContextTypes.DEFAULT_TYPE, resume
     """Просмотр конкретного резюме"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     await clear_reply_markup_from_query(query)
 
@@ -306,21 +446,19 @@ async def view_resume(update: Update, context: ContextTypes.DEFAULT_TYPE, resume
         parse_mode=ParseMode.HTML
     )
 
-    # Генерируем PDF заново
-    pdf_data, error = latex_gen.generate_pdf(session, session.get('vacancy_keywords'))
+    # Генерируем PDF заново (неизмененное резюме - из кэша PDF)
+    pdf_data, error = await render_resume_pdf(session, backend=config.RENDER_PREVIEW_BACKEND)
 
     if pdf_data:
+        resume = session.get('resumes', [])[resume_idx]
         caption = f"""<b>📄 Твое резюме</b>
 
-Дата создания: {session.get('resumes', [])[resume_idx]['date']}"""
+Дата создания: {resume['date']}"""
 
-        await query.message.reply_document(
-            document=pdf_data,
-            filename=f"Resume_{session.get('full_name', 'User').replace(' ', '_')}.pdf",
-            caption=caption,
-            parse_mode=ParseMode.HTML,
-            reply_markup=kb.main_menu()
-        )
+        digest, file_id = await send_resume_pdf(query.message, session, pdf_data, caption, kb.main_menu())
+        if file_id:
+            resume['pdf_sha256'] = digest
+            resume['file_id'] = file_id
     else:
         # .tex файл
         latex_code = latex_gen.generate_resume(session, session.get('vacancy_keywords'))
@@ -343,7 +481,7 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await safe_answer_callback_query(query)
 
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
     if is_fast_duplicate_click(session, query):
         return MENU
 
@@ -427,7 +565,7 @@ async def start_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало сбора данных"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки главного меню
     await clear_reply_markup_from_query(query)
@@ -452,7 +590,7 @@ async def start_collection(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ask_current_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Задать текущий вопрос"""
     user_id = update.effective_user.id if update.callback_query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     last_question_id = session.get('last_question_message_id')
     if last_question_id:
@@ -546,7 +684,7 @@ async def ask_current_question(update: Update, context: ContextTypes.DEFAULT_TYP
 async def process_text_answer(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текстового ответа"""
     user_id = update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
     text = update.message.text
     stripped = (text or '').strip().lower()
 
@@ -577,8 +715,11 @@ async def process_text_answer(update: Update, context: ContextTypes.DEFAULT_TYPE
     rewrite_applied = False
     if question['key'] in AI_REWRITE_FIELDS and text and text.strip():
         try:
-            improved_text = ai.improve_user_text(text, question['key'])
-            if improved_text and improved_text.strip():
+            improved_text = await run_ai_task(user_id, ai.improve_user_text_async(text, question['key']))
+            if improved_text is None:
+                # Пользователь ушел дальше (/start, /new) - ответ больше не нужен
+                return None
+            if improved_text.strip():
                 rewrite_applied = improved_text.strip() != text.strip()
                 text = improved_text
         except Exception as e:
@@ -668,7 +809,7 @@ async def skip_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Пропустить вопрос"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -719,7 +860,7 @@ async def go_back(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Вернуться назад"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -744,7 +885,7 @@ async def add_more_items(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Добавить еще элемент (опыт/проект)"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -779,7 +920,7 @@ async def next_section(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Переход к следующей секции"""
     query = update.callback_query if update.callback_query else None
     user_id = update.effective_user.id if query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     if query:
         await clear_reply_markup_from_query(query)
@@ -834,7 +975,7 @@ async def request_vacancy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Запрос текста вакансии"""
     query = update.callback_query if update.callback_query else None
     user_id = update.effective_user.id if query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     session['waiting_for'] = 'vacancy'
 
@@ -855,7 +996,7 @@ async def request_vacancy(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def process_vacancy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка текста вакансии"""
     user_id = update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
     vacancy_input = (update.message.text or '').strip()
     vacancy_text = vacancy_input
     vacancy_url = _extract_first_url(vacancy_input)
@@ -870,7 +1011,13 @@ async def process_vacancy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session['vacancy_url'] = vacancy_url or ''
 
     if vacancy_url:
-        extracted_text, _fetch_error = await asyncio.to_thread(_fetch_vacancy_text_from_url, vacancy_url)
+        # Популярные вакансии приходят многократно: страницу не скачиваем повторно
+        extracted_text = ai.vacancy_cache.get_text(vacancy_url)
+        if not extracted_text:
+            started = time.monotonic()
+            extracted_text, _fetch_error = await asyncio.to_thread(_fetch_vacancy_text_from_url, vacancy_url)
+            if extracted_text:
+                ai.vacancy_cache.put_text(vacancy_url, extracted_text, time.monotonic() - started)
         if not extracted_text:
             try:
                 await analyzing_msg.delete()
@@ -894,7 +1041,10 @@ async def process_vacancy(update: Update, context: ContextTypes.DEFAULT_TYPE):
     logger.info(f"✅ API key configured: {bool(config.GOOGLE_API_KEY)}")
 
     try:
-        keywords = ai.extract_keywords_from_vacancy(vacancy_text)
+        keywords = await run_ai_task(user_id, ai.extract_keywords_from_vacancy_async(vacancy_text))
+        if keywords is None:
+            await analyzing_msg.delete()
+            return None
         session['vacancy_keywords'] = keywords
 
         await analyzing_msg.delete()
@@ -933,7 +1083,7 @@ async def show_sections_editor(update: Update, context: ContextTypes.DEFAULT_TYP
     """Показать редактор разделов"""
     query = update.callback_query if update.callback_query else None
     user_id = update.effective_user.id if query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     msg = "<b>Редактирование разделов резюме</b>\n\n"
 
@@ -992,7 +1142,7 @@ async def edit_section(update: Update, context: ContextTypes.DEFAULT_TYPE, secti
     """Редактирование раздела"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     await clear_reply_markup_from_query(query)
 
@@ -1085,7 +1235,7 @@ async def delete_section(update: Update, context: ContextTypes.DEFAULT_TYPE, sec
     """Удаление раздела"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -1126,7 +1276,7 @@ async def finalize_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     user_id = update.effective_user.id
     username = update.effective_user.username
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -1136,28 +1286,24 @@ async def finalize_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode=ParseMode.HTML
     )
 
-    # Сохраняем в Google Sheets
+    # Сохраняем в Google Sheets (фоновая запись)
     session['status'] = 'completed'
     session['resume_date'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-    save_ok = db.save_user_data(user_id, username, session)
-    if not save_ok:
-        logger.warning("⚠️ Не удалось сохранить данные пользователя %s перед генерацией", user_id)
+    store.queue_user_data(user_id, username, session)
 
     # Генерируем PDF
-    pdf_data, error = latex_gen.generate_pdf(session, session.get('vacancy_keywords'))
+    pdf_data, error = await render_resume_pdf(session)
 
     await creating_msg.delete()
 
+    sent_file = {}
     if pdf_data:
-        # Отправляем PDF
+        # Отправляем PDF (повторно тот же файл - по file_id)
         caption = "<b>Твое резюме готово!</b>"
 
-        await query.message.reply_document(
-            document=pdf_data,
-            filename=f"Resume_{session.get('full_name', 'User').replace(' ', '_')}.pdf",
-            caption=caption,
-            parse_mode=ParseMode.HTML
-        )
+        digest, file_id = await send_resume_pdf(query.message, session, pdf_data, caption)
+        if file_id:
+            sent_file = {'pdf_sha256': digest, 'file_id': file_id}
     else:
         # Если PDF не создался, отправляем .tex файл
         latex_code = latex_gen.generate_resume(session, session.get('vacancy_keywords'))
@@ -1185,16 +1331,10 @@ async def finalize_resume(update: Update, context: ContextTypes.DEFAULT_TYPE):
     session['resumes'].append({
         'date': datetime.now().strftime('%Y-%m-%d %H:%M'),
         'name': session.get('full_name', 'Резюме'),
-        'template': session.get('template', 'Modern')
+        'template': session.get('template', 'Modern'),
+        **sent_file
     })
 
-    if not save_ok:
-        await query.message.reply_text(
-            "Не удалось сохранить данные в таблицу с первого раза. Попробую повторно в фоне.",
-            parse_mode=ParseMode.HTML
-        )
-        db.save_user_data(user_id, username, session)
-
     # Запускаем сбор feedback
     return await start_feedback(update, context)
 
@@ -1203,7 +1343,7 @@ async def start_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Начало сбора обратной связи"""
     query = update.callback_query if update.callback_query else None
     user_id = update.effective_user.id if query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     session['feedback'] = {}
     session['feedback_question'] = 0
@@ -1226,7 +1366,7 @@ async def start_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def ask_feedback_question(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Задать вопрос обратной связи"""
     user_id = update.effective_user.id if update.callback_query else update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     idx = session.get('feedback_question', 0)
 
@@ -1283,7 +1423,7 @@ async def save_rating(update: Update, context: ContextTypes.DEFAULT_TYPE, rating
     """Сохранить оценку"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -1304,7 +1444,7 @@ async def save_time(update: Update, context: ContextTypes.DEFAULT_TYPE, time_cod
     """Сохранить время"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -1332,7 +1472,7 @@ async def process_answer(update: Update, context: ContextTypes.DEFAULT_TYPE, ans
     """Обработка ответа да/нет"""
     query = update.callback_query
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     # Деактивируем кнопки
     await clear_reply_markup_from_query(query)
@@ -1353,15 +1493,10 @@ async def finish_feedback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Завершение сбора обратной связи"""
     user_id = update.effective_user.id if update.callback_query else update.message.from_user.id
     username = update.effective_user.username if update.callback_query else update.message.from_user.username
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
-    # Сохраняем feedback
-    db.save_feedback(user_id, username, session.get('feedback', {}))
-
-    try:
-        db.update_analytics()
-    except Exception as e:
-        logger.error(f"Analytics error: {e}")
+    # Сохраняем feedback (фоновая запись вместе со строкой пользователя)
+    store.queue_feedback(user_id, username, session.get('feedback', {}), user_data=session)
 
     msg = """<b>Спасибо за участие в исследовании!</b>
 
@@ -1440,7 +1575,8 @@ async def new_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /new"""
 
     user_id = update.effective_user.id
-    session = get_user_session(user_id)
+    cancel_ai_task(user_id)
+    session = await get_user_session(user_id)
     session['username'] = update.effective_user.username
     # Сбрасываем состояние
     _reset_resume_data(session)
@@ -1472,7 +1608,7 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def process_feedback_comment(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка комментария в feedback"""
     user_id = update.message.from_user.id
-    session = get_user_session(user_id)
+    session = await get_user_session(user_id)
 
     if session['feedback'].get('comment_requested'):
         session['feedback']['comment'] = update.message.text
@@ -1487,9 +1623,90 @@ async def feedback_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await start_feedback(update, context)
 
 
+async def analytics_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /analytics (только для администратора): снимок аналитики сейчас"""
+    if update.effective_user.username != config.ADMIN_USERNAME:
+        return
+
+    result = await store.update_analytics(force=True)
+    metrics = await store.analytics_metrics() or {}
+    render = renderer.stats()
+
+    msg = "<b>📊 Аналитика</b>\n\n"
+    msg += "Снимок записан в таблицу\n\n" if result else "⚠️ Не удалось записать снимок\n\n"
+    msg += f"Всего пользователей: {metrics.get('total_users', 0)}\n"
+    msg += f"Завершили резюме: {metrics.get('completed', 0)} ({metrics.get('conversion', 0):.1f}%)\n"
+    msg += f"Средняя оценка: {metrics.get('avg_rating', 0):.1f}\n"
+    msg += f"Используют резюме: {metrics.get('will_use', 0)}\n\n"
+    msg += f"Очередь рендера: {render['queued']}, в работе: {render['active']}\n"
+    rewrites = ai.rewrite_cache.stats()
+    msg += f"Кэш AI: {rewrites['hit_ratio'] * 100:.0f}% попаданий, сэкономлено {rewrites['saved_seconds']:.0f} c\n"
+    vacancies = ai.vacancy_cache.stats()
+    msg += f"Кэш вакансий: {vacancies['hit_ratio'] * 100:.0f}% попаданий, сэкономлено {vacancies['saved_seconds']:.0f} c"
+
+    await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
+
+
+async def analytics_rollup_job(context: ContextTypes.DEFAULT_TYPE):
+    """Плановый снимок аналитики; пропускается, если ничего не изменилось"""
+    result = await store.update_analytics()
+    if result is None:
+        logger.info("📊 Аналитика не изменилась, снимок пропущен")
+    elif not result:
+        logger.error("Analytics error: не удалось записать снимок")
+
+
+async def session_maintenance_job(context: ContextTypes.DEFAULT_TYPE):
+    """Периодическая запись сессий в SQLite и удаление устаревших"""
+    try:
+        # Сериализация - здесь, где обработчики меняют сессии; диск - в потоке
+        await asyncio.to_thread(user_sessions.write_rows, user_sessions.dirty_rows())
+        await asyncio.to_thread(user_sessions.expire)
+        await asyncio.to_thread(ai.rewrite_cache.expire)
+        await asyncio.to_thread(ai.vacancy_cache.expire)
+    except Exception as e:
+        logger.error(f"Session store error: {e}")
+
+
+async def post_init(application: Application):
+    """Запуск фоновых сервисов"""
+    await renderer.start()
+    writer.start()
+    application.job_queue.run_repeating(
+        session_maintenance_job,
+        interval=config.SESSION_FLUSH_INTERVAL,
+        first=config.SESSION_FLUSH_INTERVAL
+    )
+    application.job_queue.run_repeating(
+        analytics_rollup_job,
+        interval=config.ANALYTICS_ROLLUP_INTERVAL,
+        first=config.ANALYTICS_ROLLUP_FIRST
+    )
+
+
+async def post_shutdown(application: Application):
+    """Освобождение ресурсов при остановке"""
+    await renderer.stop()
+    await asyncio.to_thread(writer.stop)
+    store.shutdown(wait=False)
+    user_sessions.close()
+    ai.rewrite_cache.close()
+    ai.vacancy_cache.close()
+
+
 def main():
     """Запуск бота"""
-    application = Application.builder().token(config.TELEGRAM_TOKEN).build()
+    application = (
+        Application.builder()
+        .token(config.TELEGRAM_TOKEN)
+        # Разные пользователи - параллельно, один пользователь - по очереди
+        .concurrent_updates(PerUserUpdateProcessor(
+            config.CONCURRENT_UPDATES, on_wait=preempt_ai_task, scope=hold_user_session
+        ))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     # Добавляем обработчик ошибок
     application.add_error_handler(error_handler)
@@ -1548,6 +1765,7 @@ def main():
     application.add_handler(conv_handler)
     application.add_handler(CommandHandler('help', help_command))
     application.add_handler(CommandHandler('feedback', feedback_cmd))
+    application.add_handler(CommandHandler('analytics', analytics_command))
 
     logger.info("🤖 Bot started!")
     application.run_polling(
@@ -11,6 +11,77 @@ ADMIN_USERNAME = os.getenv('ADMIN_USERNAME', 'karbarkarrr')
 SPREADSHEET_ID = os.getenv('SPREADSHEET_ID')
 CREDENTIALS_FILE = 'credentials.json'
 GOOGLE_API_KEY = os.getenv('GOOGLE_API_KEY') or os.getenv('GEMINI_API_KEY', '')
+AI_MAX_CONCURRENCY = int(os.getenv('AI_MAX_CONCURRENCY', '4'))
+AI_REQUEST_TIMEOUT = float(os.getenv('AI_REQUEST_TIMEOUT', '30'))
+# Кэш переформулировок AI
+AI_CACHE_DB_PATH = os.getenv('AI_CACHE_DB_PATH', 'ai_cache.db')
+AI_CACHE_SIZE = int(os.getenv('AI_CACHE_SIZE', '1000'))
+AI_CACHE_TTL = int(os.getenv('AI_CACHE_TTL_DAYS', '30')) * 24 * 3600
+AI_CACHE_MAX_ENTRIES = int(os.getenv('AI_CACHE_MAX_ENTRIES', '50000'))
+# Кэш анализа вакансий (ссылка -> текст, текст -> ключевые слова)
+VACANCY_CACHE_DB_PATH = os.getenv('VACANCY_CACHE_DB_PATH', AI_CACHE_DB_PATH)
+VACANCY_CACHE_SIZE = int(os.getenv('VACANCY_CACHE_SIZE', '500'))
+VACANCY_CACHE_TTL = int(os.getenv('VACANCY_CACHE_TTL_HOURS', '72')) * 3600
+VACANCY_CACHE_MAX_ENTRIES = int(os.getenv('VACANCY_CACHE_MAX_ENTRIES', '20000'))
+# Почти дубликаты вакансий (MinHash/LSH): порог похожести и размер индекса
+VACANCY_SIMILARITY_THRESHOLD = float(os.getenv('VACANCY_SIMILARITY_THRESHOLD', '0.8'))
+VACANCY_INDEX_SIZE = int(os.getenv('VACANCY_INDEX_SIZE', '5000'))
+# Словарь навыков (синонимы -> канонические имена)
+SKILLS_TAXONOMY_PATH = os.getenv('SKILLS_TAXONOMY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'skills_taxonomy.json'))
+
+# Сколько апдейтов Telegram обрабатывается одновременно
+CONCURRENT_UPDATES = int(os.getenv('CONCURRENT_UPDATES', '64'))
+
+# Хранилище (Google Sheets)
+STORAGE_WORKERS = int(os.getenv('STORAGE_WORKERS', '4'))
+STORAGE_TIMEOUT = float(os.getenv('STORAGE_TIMEOUT', '20'))
+# Индекс UserID -> строка перестраивается не реже чем раз в столько секунд
+SHEETS_ROW_INDEX_TTL = float(os.getenv('SHEETS_ROW_INDEX_TTL', '600'))
+WRITE_BEHIND_INTERVAL = float(os.getenv('WRITE_BEHIND_INTERVAL', '5'))
+WRITE_BEHIND_MAX_PENDING = int(os.getenv('WRITE_BEHIND_MAX_PENDING', '50'))
+WRITE_BEHIND_MAX_BACKOFF = float(os.getenv('WRITE_BEHIND_MAX_BACKOFF', '120'))
+
+# Аналитика
+ANALYTICS_DB_PATH = os.getenv('ANALYTICS_DB_PATH', 'analytics.db')
+ANALYTICS_AUDIT_INTERVAL = float(os.getenv('ANALYTICS_AUDIT_HOURS', '24')) * 3600
+ANALYTICS_ROLLUP_INTERVAL = float(os.getenv('ANALYTICS_ROLLUP_HOURS', '24')) * 3600
+# Первый снимок вскоре после старта: иначе бот, перезапускаемый чаще интервала,
+# не пишет снимков вовсе; без новых записей снимок все равно пропускается
+ANALYTICS_ROLLUP_FIRST = float(os.getenv('ANALYTICS_ROLLUP_FIRST', '60'))
+
+# Сессии пользователей
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.db')
+SESSION_CACHE_SIZE = int(os.getenv('SESSION_CACHE_SIZE', '1000'))
+SESSION_TTL = int(os.getenv('SESSION_TTL_DAYS', '30')) * 24 * 3600
+SESSION_FLUSH_INTERVAL = int(os.getenv('SESSION_FLUSH_INTERVAL', '60'))
+
+# Рендер PDF
+RENDER_WORKERS = int(os.getenv('RENDER_WORKERS', '2'))
+RENDER_QUEUE_SIZE = int(os.getenv('RENDER_QUEUE_SIZE', '20'))
+RENDER_JOB_TIMEOUT = float(os.getenv('RENDER_JOB_TIMEOUT', '240'))
+# Рабочие каталоги компиляции: по умолчанию /dev/shm, при нехватке места - диск
+SCRATCH_ROOT = os.getenv('SCRATCH_ROOT', '')
+SCRATCH_MIN_FREE_BYTES = int(os.getenv('SCRATCH_MIN_FREE_MB', '64')) * 1024 * 1024
+LATEX_CACHE_DIR = os.getenv('LATEX_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.latex_cache'))
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', '5000'))
+# Движок TeX: pdflatex, xelatex, lualatex, tectonic или auto (замер при старте)
+TEX_ENGINE = os.getenv('TEX_ENGINE', 'pdflatex')
+# Бэкенд рендера по умолчанию: latex (pdflatex) или native (fpdf2, без TeX)
+RENDER_BACKEND = os.getenv('RENDER_BACKEND', 'latex')
+# Бэкенд для просмотра сохраненного резюме ("Мои резюме"). По умолчанию тот же
+# pdflatex, что и у готового резюме: PDF берется из кэша и уходит по file_id;
+# native - только по явному выбору
+RENDER_PREVIEW_BACKEND = os.getenv('RENDER_PREVIEW_BACKEND', 'latex')
+# При переполненной очереди TeX рендерить через native вместо отказа
+RENDER_NATIVE_FALLBACK = os.getenv('RENDER_NATIVE_FALLBACK', 'true').lower() == 'true'
+RESUME_FONT_DIR = os.getenv('RESUME_FONT_DIR', '/usr/share/fonts/truetype/dejavu')
+
+# Кэш готовых PDF
+PDF_CACHE_DIR = os.getenv('PDF_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.pdf_cache'))
+PDF_CACHE_MEMORY_BYTES = int(os.getenv('PDF_CACHE_MEMORY_MB', '32')) * 1024 * 1024
+PDF_CACHE_DISK_BYTES = int(os.getenv('PDF_CACHE_DISK_MB', '512')) * 1024 * 1024
+# Сжатие и линеаризация PDF перед отправкой (нужен pikepdf)
+PDF_OPTIMIZE = os.getenv('PDF_OPTIMIZE', 'true').lower() == 'true'
 
 # Структурированные вопросы для сбора данных
 QUESTIONS_STRUCTURE = {
@@ -2,7 +2,10 @@ import gspread
 from datetime import datetime
 import config
 import os
+from analytics import AnalyticsCounters
 import json
+import re
+import threading
 import time
 from oauth2client.service_account import ServiceAccountCredentials
 
@@ -43,6 +46,14 @@ class Database:
         self.spreadsheet = self.client.open_by_key(config.SPREADSHEET_ID)
         self._init_sheets()
 
+        # Индекс UserID -> номер строки на листе Users (строится лениво)
+        self._row_index = None
+        self._row_index_built_at = 0
+        self._users_headers = None
+        self._index_lock = threading.Lock()
+
+        self.counters = AnalyticsCounters()
+
 
     def _init_sheets(self):
         """Инициализация листов"""
@@ -108,6 +119,34 @@ class Database:
                 records.append(dict(zip(headers, row[:len(headers)])))
             return records
 
+    def get_columns(self, sheet, names):
+        """Прочитать только нужные столбцы листа одним batch_get.
+
+        Возвращает {заголовок: [значения со 2-й строки]}; все списки одной
+        длины, отсутствующие столбцы заполнены пустыми строками.
+        """
+        if sheet is self.users_sheet:
+            headers = self._get_users_headers()
+        else:
+            headers = sheet.row_values(1)
+        positions = {name: headers.index(name) + 1 for name in names if name in headers}
+
+        columns = dict.fromkeys(names)
+        if positions:
+            ranges = []
+            for position in positions.values():
+                letter = self._column_letter(position)
+                ranges.append(f"{letter}2:{letter}")
+            results = sheet.batch_get(ranges, major_dimension='COLUMNS')
+            for name, values in zip(positions, results):
+                columns[name] = list(values[0]) if values else []
+
+        length = max((len(values) for values in columns.values() if values), default=0)
+        for name, values in columns.items():
+            values = values or []
+            columns[name] = values + [''] * (length - len(values))
+        return columns
+
     def _column_letter(self, index):
         """1-based column index to A1 letter notation."""
         letters = ""
@@ -116,8 +155,68 @@ class Database:
             letters = chr(65 + rem) + letters
         return letters
 
-    def save_user_data(self, user_id, username, data):
-        """Сохранение данных пользователя"""
+    def _build_row_index(self):
+        """Построить индекс UserID -> строка по первому столбцу листа Users"""
+        ids = self.users_sheet.col_values(1)
+        index = {}
+        for row_num, value in enumerate(ids[1:], start=2):
+            if value:
+                # Как и find(), берем первое вхождение
+                index.setdefault(str(value), row_num)
+        self._row_index = index
+        self._row_index_built_at = time.monotonic()
+        return index
+
+    def _locate_row(self, user_id, refresh=False):
+        """Номер строки пользователя по индексу (None, если пользователя нет).
+
+        Индекс периодически перестраивается (SHEETS_ROW_INDEX_TTL), чтобы
+        подхватить строки, сдвинутые или удаленные в таблице вручную.
+        """
+        with self._index_lock:
+            stale = time.monotonic() - self._row_index_built_at > config.SHEETS_ROW_INDEX_TTL
+            if refresh or stale or self._row_index is None:
+                self._build_row_index()
+            return self._row_index.get(str(user_id))
+
+    def _forget_row_index(self):
+        with self._index_lock:
+            self._row_index = None
+            self._users_headers = None
+
+    def _remember_rows(self, user_ids, append_response):
+        """Запомнить строки, добавленные append_row/append_rows, по ответу API"""
+        updated_range = ((append_response or {}).get('updates') or {}).get('updatedRange', '')
+        match = re.search(r'![A-Z]+(\d+)', updated_range)
+        with self._index_lock:
+            if match and self._row_index is not None:
+                first_row = int(match.group(1))
+                for offset, user_id in enumerate(user_ids):
+                    self._row_index[str(user_id)] = first_row + offset
+            else:
+                self._row_index = None
+
+    def _verified_rows(self, user_ids):
+        """Строки нескольких пользователей с одной пакетной проверкой UserID"""
+        rows = {user_id: self._locate_row(user_id) for user_id in user_ids}
+        known = [(user_id, row_num) for user_id, row_num in rows.items() if row_num]
+        if not known:
+            return rows
+        cells = self.users_sheet.batch_get([f"A{row_num}" for _, row_num in known])
+        for (user_id, _), value in zip(known, cells):
+            cell = value[0][0] if value and value[0] else ''
+            if str(cell) != str(user_id):
+                self._forget_row_index()
+                return {user_id: self._locate_row(user_id) for user_id in user_ids}
+        return rows
+
+    def _get_users_headers(self):
+        if self._users_headers is None:
+            self._users_headers = self.users_sheet.row_values(1)
+        return self._users_headers
+
+    def build_user_row(self, user_id, username, data):
+        """Строка листа Users из данных сессии"""
         # Сериализуем сложные структуры
         experiences_json = json.dumps(data.get('experiences', []), ensure_ascii=False)
         projects_json = json.dumps(data.get('projects', []), ensure_ascii=False)
@@ -156,20 +255,29 @@ class Database:
             data.get('status', 'in_progress'),
             feedback_json
         ]
+        return row_data
+
+    def save_user_data(self, user_id, username, data):
+        """Сохранение данных пользователя"""
+        row_data = self.build_user_row(user_id, username, data)
 
         attempts = 3
         for attempt in range(1, attempts + 1):
             try:
-                cell = self.users_sheet.find(str(user_id))
-                if cell:
-                    row_num = cell.row
+                # Перед записью сверяем ячейку UserID: строку могли сдвинуть или
+                # удалить вручную, и устаревший индекс затер бы чужую строку
+                row_num = self._verified_rows([user_id])[user_id]
+                if row_num:
                     end_col = self._column_letter(len(row_data))
                     self.users_sheet.update(f"A{row_num}:{end_col}{row_num}", [row_data])
                 else:
-                    self.users_sheet.append_row(row_data)
+                    response = self.users_sheet.append_row(row_data)
+                    self._remember_rows([user_id], response)
+                self.count_user_rows([row_data])
                 return True
             except Exception as e:
                 print(f"Error saving user data (attempt {attempt}/{attempts}): {e}")
+                self._forget_row_index()
                 if attempt < attempts:
                     time.sleep(0.6 * attempt)
                 else:
@@ -178,117 +286,152 @@ class Database:
     def get_user_data(self, user_id):
         """Получение данных пользователя"""
         try:
-            cell = self.users_sheet.find(str(user_id))
-            if cell:
-                row = self.users_sheet.row_values(cell.row)
-                headers = self.users_sheet.row_values(1)
-
-                data = dict(zip(headers, row))
-
-                # Десериализуем JSON
-                if 'Опыт работы (JSON)' in data and data['Опыт работы (JSON)']:
-                    try:
-                        data['experiences'] = json.loads(data['Опыт работы (JSON)'])
-                    except:
-                        data['experiences'] = []
-
-                if 'Образование (JSON)' in data and data['Образование (JSON)']:
-                    try:
-                        data['educations'] = json.loads(data['Образование (JSON)'])
-                    except:
-                        data['educations'] = []
-                elif data.get('Университет') or data.get('Специальность') or data.get('Период обучения'):
-                    data['educations'] = [{
-                        'university': data.get('Университет', ''),
-                        'degree': data.get('Специальность', ''),
-                        'study_period': data.get('Период обучения', '')
-                    }]
-
-                if 'Проекты (JSON)' in data and data['Проекты (JSON)']:
-                    try:
-                        data['projects'] = json.loads(data['Проекты (JSON)'])
-                    except:
-                        data['projects'] = []
-
-                if 'Ключевые слова (JSON)' in data and data['Ключевые слова (JSON)']:
-                    try:
-                        data['vacancy_keywords'] = json.loads(data['Ключевые слова (JSON)'])
-                    except:
-                        data['vacancy_keywords'] = {}
-
-                return data
+            row = self._read_user_row(user_id)
+            if row:
+                return self.parse_user_row(row, self._get_users_headers())
             return None
         except Exception as e:
             print(f"Error getting user data: {e}")
             return None
 
-    def save_feedback(self, user_id, username, feedback_data):
-        """Сохранение обратной связи"""
+    def parse_user_row(self, row, headers=None):
+        """Данные пользователя из строки листа Users"""
+        data = dict(zip(headers or self.USERS_HEADERS, row))
+
+        # Десериализуем JSON
+        if 'Опыт работы (JSON)' in data and data['Опыт работы (JSON)']:
+            try:
+                data['experiences'] = json.loads(data['Опыт работы (JSON)'])
+            except:
+                data['experiences'] = []
+
+        if 'Образование (JSON)' in data and data['Образование (JSON)']:
+            try:
+                data['educations'] = json.loads(data['Образование (JSON)'])
+            except:
+                data['educations'] = []
+        elif data.get('Университет') or data.get('Специальность') or data.get('Период обучения'):
+            data['educations'] = [{
+                'university': data.get('Университет', ''),
+                'degree': data.get('Специальность', ''),
+                'study_period': data.get('Период обучения', '')
+            }]
+
+        if 'Проекты (JSON)' in data and data['Проекты (JSON)']:
+            try:
+                data['projects'] = json.loads(data['Проекты (JSON)'])
+            except:
+                data['projects'] = []
+
+        if 'Ключевые слова (JSON)' in data and data['Ключевые слова (JSON)']:
+            try:
+                data['vacancy_keywords'] = json.loads(data['Ключевые слова (JSON)'])
+            except:
+                data['vacancy_keywords'] = {}
+
+        return data
+
+    def _read_user_row(self, user_id):
+        """Прочитать строку пользователя по индексу, без поиска по листу"""
+        end_col = self._column_letter(len(self.USERS_HEADERS))
+        for refresh in (False, True):
+            row_num = self._locate_row(user_id, refresh=refresh)
+            if not row_num:
+                return None
+            values = self.users_sheet.get(f"A{row_num}:{end_col}{row_num}")
+            row = values[0] if values else []
+            if row and str(row[0]) == str(user_id):
+                return row
+            # Индекс устарел - перестраиваем и пробуем еще раз
+            self._users_headers = None
+        return None
+
+    def build_feedback_row(self, user_id, username, feedback_data):
+        """Строка листа Feedback"""
+        return [
+            user_id,
+            username or '',
+            datetime.now().strftime('%Y-%m-%d %H:%M'),
+            feedback_data.get('resume_rating', ''),
+            feedback_data.get('will_use', ''),
+            feedback_data.get('editing_time', ''),
+            feedback_data.get('did_edit', ''),
+            feedback_data.get('overall_experience', ''),
+            feedback_data.get('comment', ''),
+            feedback_data.get('conversion_status', 'completed')
+        ]
+
+    def save_feedback(self, user_id, username, feedback_data, user_data=None):
+        """Сохранение обратной связи.
+
+        Если передана сессия пользователя, его строка в Users пишется из нее
+        (как в WriteBehindQueue.queue_feedback), без чтения листа: строка из
+        листа с русскими заголовками не подходит для build_user_row.
+        """
         try:
-            row_data = [
-                user_id,
-                username or '',
-                datetime.now().strftime('%Y-%m-%d %H:%M'),
-                feedback_data.get('resume_rating', ''),
-                feedback_data.get('will_use', ''),
-                feedback_data.get('editing_time', ''),
-                feedback_data.get('did_edit', ''),
-                feedback_data.get('overall_experience', ''),
-                feedback_data.get('comment', ''),
-                feedback_data.get('conversion_status', 'completed')
-            ]
+            row_data = self.build_feedback_row(user_id, username, feedback_data)
             self.feedback_sheet.append_row(row_data)
+            self.count_feedback_rows([row_data])
 
             # Также сохраняем в основную таблицу
-            user_data = self.get_user_data(user_id)
-            if user_data:
-                user_data['feedback'] = feedback_data
-                self.save_user_data(user_id, username, user_data)
+            if user_data is not None:
+                self.save_user_data(user_id, username, dict(user_data, feedback=feedback_data))
 
             return True
         except Exception as e:
             print(f"Error saving feedback: {e}")
             return False
 
-    def update_analytics(self):
-        """Обновление аналитики"""
+    def count_user_rows(self, rows):
+        """Обновить счетчики аналитики по записанным строкам Users"""
+        status_idx = self.USERS_HEADERS.index('Статус')
+        for row in rows:
+            self.counters.record_user(row[0], row[status_idx])
+
+    def count_feedback_rows(self, rows):
+        """Обновить счетчики аналитики по добавленным строкам Feedback"""
+        for row in rows:
+            self.counters.record_feedback(row[3], row[4], row[5], row[6])
+
+    def audit_analytics(self):
+        """Полная сверка счетчиков аналитики с листами Users и Feedback"""
+        users = self.get_columns(self.users_sheet, ['UserID', 'Статус'])
+        feedback = self.get_columns(
+            self.feedback_sheet,
+            ['Оценка резюме', 'Будет использовать', 'Время редактирования', 'Редактировал резюме']
+        )
+        self.counters.reset(
+            [(user_id, status) for user_id, status in zip(users['UserID'], users['Статус']) if user_id],
+            list(zip(*feedback.values()))
+        )
+
+    def update_analytics(self, force=False):
+        """Снимок аналитики в лист Analytics.
+
+        Без force снимок пропускается (возвращается None), если с прошлого
+        снимка не было новых записей.
+        """
         try:
-            all_users = self._get_all_records(self.users_sheet, self.USERS_HEADERS)
-
-            total_users = len(all_users)
-            completed = len([u for u in all_users if u.get('Статус') == 'completed'])
-            conversion = (completed / total_users * 100) if total_users > 0 else 0
-
-            # Получаем feedback
-            all_feedback = self._get_all_records(self.feedback_sheet, self.FEEDBACK_HEADERS)
-
-            # Исправление: проверяем тип данных
-            ratings = []
-            for f in all_feedback:
-                rating_val = f.get('Оценка резюме', '')
-                if isinstance(rating_val, (int, float)):
-                    ratings.append(int(rating_val))
-                elif isinstance(rating_val, str) and rating_val.isdigit():
-                    ratings.append(int(rating_val))
-
-            avg_rating = sum(ratings) / len(ratings) if ratings else 0
-
-            will_use = len([f for f in all_feedback if f.get('Будет использовать') == 'Да'])
-            edited = len([f for f in all_feedback if f.get('Редактировал резюме') == 'Да'])
-            quick_edit = len([f for f in all_feedback if '15' in str(f.get('Время редактирования', ''))])
+            if not force and not self.counters.changed_since_snapshot():
+                return None
+            # Листы целиком читаем только при плановой сверке
+            if self.counters.needs_audit():
+                self.audit_analytics()
+            metrics = self.counters.metrics()
 
             row_data = [
                 datetime.now().strftime('%Y-%m-%d'),
-                total_users,
-                completed,
-                f"{conversion:.1f}%",
-                f"{avg_rating:.1f}",
-                will_use,
-                quick_edit,
-                edited
+                metrics['total_users'],
+                metrics['completed'],
+                f"{metrics['conversion']:.1f}%",
+                f"{metrics['avg_rating']:.1f}",
+                metrics['will_use'],
+                metrics['quick_edit'],
+                metrics['edited']
             ]
 
             self.analytics_sheet.append_row(row_data)
+            self.counters.mark_snapshot()
             return True
         except Exception as e:
             print(f"Error updating analytics: {e}")
@@ -1,12 +1,94 @@
+import hashlib
+import json
 import subprocess
 import os
+import re
+import shutil
 import tempfile
+from collections import OrderedDict
 from datetime import datetime
 
+import config
+from native_renderer import NativeRenderer
+from scratch_dirs import ScratchDirPool
+from skill_matcher import SkillMatcher
+from skill_taxonomy import SKILL_TAXONOMY
+from tex_engines import get_engine
+from template_engine import TemplateRegistry, preamble_version, split_preamble
+
+LATEX_SPECIALS = {
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\^{}'
+}
+LATEX_SPECIALS_RE = re.compile('|'.join(re.escape(char) for char in LATEX_SPECIALS))
+
 
 class LaTeXGenerator:
-    def __init__(self):
-        self.template = self._get_template()
+    FORMAT_BUILD_TIMEOUT = 120
+
+    DEFAULT_TEMPLATE = 'modern'
+
+    # Слот шаблона -> (метод генерации, поля сессии, от которых он зависит,
+    # зависит ли от ключевых слов вакансии)
+    SECTIONS = {
+        'EDUCATION_SECTION': ('_generate_education', ('educations', 'university', 'degree', 'study_period'), False),
+        'EXPERIENCE_SECTION': ('_generate_experience', ('experiences',), True),
+        'PROJECTS_SECTION': ('_generate_projects', ('projects',), True),
+        'SKILLS_SECTION': ('_generate_skills', ('technical_skills', 'soft_skills'), True),
+        'ACHIEVEMENTS_SECTION': ('_generate_achievements', ('achievements',), False),
+        'LANGUAGES_SECTION': ('_generate_languages', ('languages',), False),
+        'INTERESTS_SECTION': ('_generate_interests', ('interests',), False),
+    }
+
+    def __init__(self, cache_dir=None, texmf_dir=None, engine=None, scratch_dir=None):
+        # Движок TeX; 'auto' выбирается замером при старте RenderService
+        self.engine = get_engine(engine or config.TEX_ENGINE)
+        # Шаблоны разбираются один раз; выбираются по session['template_id']
+        self._register_templates()
+        self.cache_dir = cache_dir or config.LATEX_CACHE_DIR
+        # Постоянный каталог TEXMFVAR/TEXMFCONFIG (у долгоживущих воркеров);
+        # без него каждая компиляция начинает с пустых кэшей во временной папке
+        self.texmf_dir = texmf_dir
+        # Переиспользуемые рабочие каталоги (на /dev/shm); создаются при первой компиляции
+        self.scratch_dir = scratch_dir
+        self._scratch = None
+        # Версия преамбулы -> имя собранного формата (None - собрать не удалось)
+        self._formats = {}
+        # Отпечаток данных секции -> готовый фрагмент LaTeX
+        self._fragments = OrderedDict()
+        self.fragment_cache_size = config.FRAGMENT_CACHE_SIZE
+        self.fragment_hits = 0
+        self.fragment_misses = 0
+        # Набор ключевых слов -> автомат для подсветки
+        self._matchers = {}
+        # Второй бэкенд: PDF без TeX
+        self.native = NativeRenderer(cache_dir=self.cache_dir)
+        # Разбор лога последней компиляции (для проверки качества движка)
+        self.last_errors = []
+        self.last_missing_characters = []
+
+    def _register_templates(self):
+        """Шаблоны с преамбулой под текущий движок (шрифты для xelatex/lualatex)"""
+        self.templates = TemplateRegistry(self.DEFAULT_TEMPLATE)
+        self.templates.register(
+            self.DEFAULT_TEMPLATE, self.engine.prepare_template(self._get_template(), config.RESUME_FONT_DIR)
+        )
+        self.template = self.templates.get().source
+        # Версия шаблона = хэш преамбулы: по ней кэшируется готовый формат
+        self.preamble = self.templates.get().preamble
+        self.template_version = self.templates.get().version
+
+    def set_engine(self, name):
+        """Сменить движок TeX (после замера); преамбула шаблонов меняется вместе с ним"""
+        self.engine = get_engine(name)
+        self._register_templates()
 
     def _get_template(self):
         """Базовый шаблон LaTeX (Jake's Resume)"""
@@ -102,21 +184,22 @@ class LaTeXGenerator:
 
     def generate_resume(self, user_data, keywords=None):
         """Генерация LaTeX кода резюме"""
-        latex_content = self.template
+        template = self.templates.get(user_data.get('template_id'))
+        values = {}
 
         # Личная информация
-        latex_content = latex_content.replace('{FULL_NAME}', self._escape_latex(user_data.get('full_name', 'Ваше Имя')))
+        values['FULL_NAME'] = self._escape_latex(user_data.get('full_name', 'Ваше Имя'))
         email = user_data.get('email', 'email@example.com')
         phone = user_data.get('phone', '+7 999 999-99-99')
-        latex_content = latex_content.replace('{EMAIL}', self._escape_latex(email))
-        latex_content = latex_content.replace('{PHONE}', self._escape_latex(phone))
+        values['EMAIL'] = self._escape_latex(email)
+        values['PHONE'] = self._escape_latex(phone)
 
         # Локация
         location = user_data.get('location', '')
         if location:
-            latex_content = latex_content.replace('{LOCATION_PIPE}', f' $|$ {self._escape_latex(location)}')
+            values['LOCATION_PIPE'] = f' $|$ {self._escape_latex(location)}'
         else:
-            latex_content = latex_content.replace('{LOCATION_PIPE}', '')
+            values['LOCATION_PIPE'] = ''
 
         # Ссылки (LinkedIn, GitHub, GitLab, Portfolio) - в одну строку
         links = []
@@ -134,40 +217,82 @@ class LaTeXGenerator:
             links.append(r'\href{https://' + self._escape_latex(portfolio) + r'}{\underline{Portfolio}}')
 
         if links:
-            latex_content = latex_content.replace('{LINKS}', ' \\\\ ' + r'\small ' + ' $|$ '.join(links))
+            values['LINKS'] = ' \\\\ ' + r'\small ' + ' $|$ '.join(links)
         else:
-            latex_content = latex_content.replace('{LINKS}', '')
-
-        # Остальные секции...
-        education = self._generate_education(user_data)
-        latex_content = latex_content.replace('{EDUCATION_SECTION}', education)
-
-        experience = self._generate_experience(user_data, keywords)
-        latex_content = latex_content.replace('{EXPERIENCE_SECTION}', experience)
-
-        projects = self._generate_projects(user_data, keywords)
-        latex_content = latex_content.replace('{PROJECTS_SECTION}', projects)
-
-        skills = self._generate_skills(user_data, keywords)
-        latex_content = latex_content.replace('{SKILLS_SECTION}', skills)
-
-        achievements = self._generate_achievements(user_data)
-        latex_content = latex_content.replace('{ACHIEVEMENTS_SECTION}', achievements)
-
-        languages = self._generate_languages(user_data)
-        latex_content = latex_content.replace('{LANGUAGES_SECTION}', languages)
-
-        interests = self._generate_interests(user_data)
-        latex_content = latex_content.replace('{INTERESTS_SECTION}', interests)
-
-        return latex_content
-
-    def generate_pdf(self, user_data, keywords=None):
-        """Генерация PDF резюме"""
+            values['LINKS'] = ''
+
+        # Остальные секции: пересобираются только изменившиеся
+        for slot in template.slot_names & self.SECTIONS.keys():
+            values[slot] = self._section_fragment(slot, user_data, keywords)
+
+        return template.render(values)
+
+    def _section_fragment(self, slot, user_data, keywords):
+        """Фрагмент секции из кэша по отпечатку ее данных (и ключевых слов)"""
+        method, fields, uses_keywords = self.SECTIONS[slot]
+        payload = [slot, [user_data.get(field) for field in fields]]
+        if uses_keywords:
+            payload.append(keywords)
+        fingerprint = hashlib.sha1(
+            json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str).encode('utf-8')
+        ).hexdigest()
+
+        fragment = self._fragments.get(fingerprint)
+        if fragment is not None:
+            self._fragments.move_to_end(fingerprint)
+            self.fragment_hits += 1
+            return fragment
+
+        self.fragment_misses += 1
+        builder = getattr(self, method)
+        fragment = builder(user_data, keywords) if uses_keywords else builder(user_data)
+        self._fragments[fingerprint] = fragment
+        while len(self._fragments) > self.fragment_cache_size:
+            self._fragments.popitem(last=False)
+        return fragment
+
+    def generate_pdf(self, user_data, keywords=None, timeout=240, backend='latex'):
+        """Генерация PDF резюме (backend='native' - без pdflatex)"""
+        if backend == 'native':
+            return self.native.render(user_data, keywords)
         latex_content = self.generate_resume(user_data, keywords)
-
+        return self.compile_pdf(latex_content, timeout=timeout)
+
+    def warm_up(self):
+        """Подготовить форматы и кэши TeX пробной компиляцией шаблона"""
+        for template in self.templates:
+            self._ensure_format(template.preamble)
+        pdf_data, _ = self.generate_pdf({}, timeout=self.FORMAT_BUILD_TIMEOUT)
+        return pdf_data is not None
+
+    def compile_pdf(self, latex_content, timeout=240):
+        """Компиляция готового LaTeX в PDF.
+
+        Если удалось собрать формат с преамбулой шаблона, документ компилируется
+        с ним; при ошибке - повторная попытка обычной компиляцией.
+        """
+        preamble = split_preamble(latex_content)
+        format_name = self._ensure_format(preamble) if preamble and self.engine.supports_format else None
+        if format_name:
+            pdf_data, error = self._compile(latex_content, timeout, format_name)
+            if pdf_data or error in (f"{self.engine.binary} не установлен", "Timeout компиляции"):
+                return pdf_data, error
+            pdf_data, error = self._compile(latex_content, timeout)
+            if pdf_data:
+                # Без формата собралось - формат устарел (например, обновили TeX)
+                self._formats[preamble_version(preamble)] = None
+            return pdf_data, error
+        return self._compile(latex_content, timeout)
+
+    @property
+    def scratch(self):
+        if self._scratch is None:
+            self._scratch = ScratchDirPool(self.scratch_dir)
+        return self._scratch
+
+    def _compile(self, latex_content, timeout, format_name=None):
         try:
-            with tempfile.TemporaryDirectory() as tmpdir:
+            with self.scratch.acquire() as tmpdir:
                 tex_file = os.path.join(tmpdir, 'resume.tex')
                 pdf_file = os.path.join(tmpdir, 'resume.pdf')
 
@@ -178,40 +303,49 @@ class LaTeXGenerator:
                 # Компилируем в PDF
                 try:
                     env = os.environ.copy()
-                    env['TEXMFHOME'] = tmpdir
-                    env['TEXMFVAR'] = tmpdir
-                    env['TEXMFCONFIG'] = tmpdir
+                    texmf_dir = self.texmf_dir or tmpdir
+                    env['TEXMFHOME'] = texmf_dir
+                    env['TEXMFVAR'] = texmf_dir
+                    env['TEXMFCONFIG'] = texmf_dir
+                    if format_name:
+                        # Пустой элемент в конце пути сохраняет стандартный поиск форматов
+                        env['TEXFORMATS'] = self.cache_dir + os.pathsep
+                    command = self.engine.command(tex_file, tmpdir, format_name)
                     result = subprocess.run(
-                        ['pdflatex', '-interaction=nonstopmode', '-file-line-error', '-output-directory', tmpdir, tex_file],
+                        command,
                         capture_output=True,
-                        timeout=240,
+                        timeout=timeout,
                         cwd=tmpdir,
                         env=env
                     )
+                    stderr = (result.stderr or b'').decode('utf-8', errors='ignore').strip()
+                    stdout = (result.stdout or b'').decode('utf-8', errors='ignore').strip()
+                    log_text = ''
+                    log_file = os.path.join(tmpdir, 'resume.log')
+                    if os.path.exists(log_file):
+                        with open(log_file, 'r', encoding='utf-8', errors='ignore') as lf:
+                            log_text = lf.read()
+                    error_lines = self.engine.parse_errors(log_text, stdout, stderr)
+                    self.last_errors = error_lines
+                    self.last_missing_characters = self.engine.missing_characters(log_text)
+
                     if os.path.exists(pdf_file):
                         with open(pdf_file, 'rb') as f:
                             pdf_data = f.read()
                         if pdf_data:
                             return pdf_data, None
                     if result.returncode != 0:
-                        stderr = (result.stderr or b'').decode('utf-8', errors='ignore').strip()
-                        stdout = (result.stdout or b'').decode('utf-8', errors='ignore').strip()
                         detail = stderr or stdout
                         if detail:
                             detail = detail[-400:]
-                        log_file = os.path.join(tmpdir, 'resume.log')
-                        if os.path.exists(log_file):
-                            with open(log_file, 'r', encoding='utf-8', errors='ignore') as lf:
-                                log_text = lf.read()
-                            error_lines = [line.strip() for line in log_text.splitlines() if line.strip().startswith('!')]
-                            if error_lines:
-                                return None, f"Ошибка компиляции: {error_lines[-1]}"
-                        return None, f"Ошибка компиляции: {detail or 'pdflatex exit code'}"
+                        if error_lines:
+                            return None, f"Ошибка компиляции: {error_lines[-1]}"
+                        return None, f"Ошибка компиляции: {detail or f'{self.engine.binary} exit code'}"
 
                     return None, "PDF не создался"
 
                 except FileNotFoundError:
-                    return None, "pdflatex не установлен"
+                    return None, f"{self.engine.binary} не установлен"
                 except subprocess.TimeoutExpired:
                     return None, "Timeout компиляции"
                 except Exception as e:
@@ -220,24 +354,75 @@ class LaTeXGenerator:
         except Exception as e:
             return None, f"Ошибка создания PDF: {str(e)}"
 
+    def _ensure_format(self, preamble):
+        """Имя формата pdflatex с заранее загруженной преамбулой (или None).
+
+        Формат собирается один раз на версию преамбулы через mylatexformat и
+        хранится в cache_dir; при компиляции с ним pdflatex пропускает
+        преамбулу документа до \\begin{document}.
+        """
+        version = preamble_version(preamble)
+        if version in self._formats:
+            return self._formats[version]
+
+        name = f"resume-{version}"
+        fmt_path = os.path.join(self.cache_dir, name + '.fmt')
+        if os.path.exists(fmt_path):
+            self._formats[version] = name
+            return name
+
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with tempfile.TemporaryDirectory() as tmpdir:
+                with open(os.path.join(tmpdir, 'preamble.tex'), 'w', encoding='utf-8') as f:
+                    f.write(preamble + '\n\\begin{document}\n\\end{document}\n')
+                env = os.environ.copy()
+                env['TEXMFVAR'] = tmpdir
+                env['TEXMFCONFIG'] = tmpdir
+                subprocess.run(
+                    ['pdflatex', '-ini', '-interaction=nonstopmode', f'-jobname={name}',
+                     '&pdflatex', 'mylatexformat.ltx', 'preamble.tex'],
+                    capture_output=True,
+                    timeout=self.FORMAT_BUILD_TIMEOUT,
+                    cwd=tmpdir,
+                    env=env
+                )
+                built = os.path.join(tmpdir, name + '.fmt')
+                if not os.path.exists(built):
+                    self._formats[version] = None
+                    return None
+                # Атомарно: параллельные воркеры могут собирать формат одновременно
+                tmp_target = f"{fmt_path}.{os.getpid()}.tmp"
+                shutil.copyfile(built, tmp_target)
+                os.replace(tmp_target, fmt_path)
+        except (OSError, subprocess.SubprocessError):
+            self._formats[version] = None
+            return None
+
+        self._formats[version] = name
+        return name
+
     def _escape_latex(self, text):
-        """Экранирование специальных символов LaTeX"""
+        """Экранирование специальных символов LaTeX (за один проход)"""
         if not text:
             return ''
-        replacements = {
-            '&': r'\&',
-            '%': r'\%',
-            '$': r'\$',
-            '#': r'\#',
-            '_': r'\_',
-            '{': r'\{',
-            '}': r'\}',
-            '~': r'\textasciitilde{}',
-            '^': r'\^{}'
-        }
-        for old, new in replacements.items():
-            text = text.replace(old, new)
-        return text
+        return LATEX_SPECIALS_RE.sub(lambda match: LATEX_SPECIALS[match.group()], text)
+
+    def _keyword_matcher(self, keywords):
+        """Поиск ключевых слов и их синонимов из словаря навыков в экранированном
+        тексте; строится один раз на набор"""
+        key = tuple(str(kw) for kw in keywords)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            if len(self._matchers) >= 64:
+                self._matchers.clear()
+            variants = SKILL_TAXONOMY.variants(key)
+            matcher = SkillMatcher(
+                {self._escape_latex(variant): name for variant, name in variants.items()},
+                {self._escape_latex(variant) for variant in SKILL_TAXONOMY.exact_case(variants)}
+            )
+            self._matchers[key] = matcher
+        return matcher
 
     def _generate_education(self, data):
         """Генерация секции образования"""
@@ -342,11 +527,8 @@ class LaTeXGenerator:
         if tech_skills:
             tech_escaped = self._escape_latex(tech_skills)
             if keywords and keywords.get('technical'):
-                for kw in keywords['technical']:
-                    tech_escaped = tech_escaped.replace(
-                        self._escape_latex(kw),
-                        r'\textbf{' + self._escape_latex(kw) + '}'
-                    )
+                matcher = self._keyword_matcher(keywords['technical'])
+                tech_escaped = matcher.highlight(tech_escaped, r'\textbf{', '}')
             section += r"""     \textbf{Технические навыки}{: """ + tech_escaped + r"""} \\
 """
 
@@ -401,7 +583,7 @@ class LaTeXGenerator:
         return section
 
     def _highlight_keywords(self, text, keywords):
-        """Подсветка ключевых слов"""
+        """Подсветка ключевых слов (каждое - не больше одного раза в строке)"""
         if not keywords:
             return text
 
@@ -411,16 +593,10 @@ class LaTeXGenerator:
         if 'keywords' in keywords:
             all_keywords.extend(keywords['keywords'])
 
-        for kw in all_keywords:
-            escaped_kw = self._escape_latex(kw)
-            if escaped_kw in text:
-                text = text.replace(
-                    escaped_kw,
-                    r'\textbf{' + escaped_kw + '}',
-                    1
-                )
-
-        return text
+        matcher = self._keyword_matcher(all_keywords)
+        if not matcher:
+            return text
+        return matcher.highlight(text, r'\textbf{', '}', first_only=True)
 
     def _generate_experience(self, data, keywords):
         """Генерация секции опыта работы"""
@@ -0,0 +1,313 @@
+import json
+import logging
+import os
+
+import config
+from skill_matcher import SkillMatcher
+from skill_taxonomy import SKILL_TAXONOMY
+
+try:
+    from fpdf import FPDF
+    from fpdf.enums import XPos, YPos
+    from fontTools import subset as font_subset
+    from fontTools.ttLib import TTFont
+    FPDF_AVAILABLE = True
+except ImportError:
+    FPDF_AVAILABLE = False
+
+
+class NativeRenderer:
+    """Рендер резюме в PDF напрямую из данных сессии, без TeX.
+
+    Повторяет одностраничную верстку шаблона 'modern' (Jake's Resume) на
+    fpdf2 со встроенными шрифтами DejaVu (кириллица). Качество набора ниже,
+    чем у pdflatex, зато PDF получается за десятки миллисекунд - для
+    быстрого превью и как запасной путь при перегрузке TeX-пула.
+    """
+
+    VERSION = '3'
+    FONT = 'DejaVu'
+    FONT_FILES = {
+        '': 'DejaVuSans.ttf',
+        'B': 'DejaVuSans-Bold.ttf',
+        'I': 'DejaVuSans-Oblique.ttf'
+    }
+    # Поля сессии, которые попадают в PDF (по ним строится ключ кэша)
+    FIELDS = (
+        'template_id', 'full_name', 'email', 'phone', 'location', 'linkedin', 'github', 'gitlab', 'portfolio',
+        'educations', 'university', 'degree', 'study_period', 'experiences', 'projects',
+        'technical_skills', 'soft_skills', 'achievements', 'languages', 'interests'
+    )
+
+    # Латиница, кириллица и типографские знаки: шрифты урезаются до этих
+    # символов один раз, иначе разбор полного DejaVu занимает большую часть рендера
+    UNICODES = (
+        list(range(0x20, 0x7F)) + list(range(0xA0, 0x180)) + list(range(0x400, 0x500))
+        + list(range(0x2010, 0x203B)) + list(range(0x2190, 0x219A)) + [0x20AC, 0x2116, 0x2122]
+    )
+
+    MARGIN = 36
+    LINE = 13
+
+    def __init__(self, font_dir=None, cache_dir=None):
+        self.font_dir = font_dir or config.RESUME_FONT_DIR
+        self.cache_dir = os.path.join(cache_dir or config.LATEX_CACHE_DIR, f'fonts-{self.VERSION}')
+        self._font_paths = None
+        self._matchers = {}
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def available(self):
+        return FPDF_AVAILABLE and os.path.exists(os.path.join(self.font_dir, self.FONT_FILES['']))
+
+    def cache_source(self, user_data, keywords=None):
+        """Строка, однозначно описывающая результат рендера"""
+        payload = {field: user_data.get(field) for field in self.FIELDS}
+        payload['keywords'] = keywords
+        return json.dumps(payload, ensure_ascii=False, sort_keys=True, default=str)
+
+    def render(self, user_data, keywords=None):
+        """Сгенерировать PDF; возвращает (pdf_data, error) как generate_pdf"""
+        if not FPDF_AVAILABLE:
+            return None, "fpdf2 не установлен"
+        try:
+            pdf = self._new_document()
+        except (OSError, RuntimeError) as e:
+            return None, f"Шрифт для PDF не найден: {e}"
+
+        try:
+            self._header(pdf, user_data)
+            self._education(pdf, user_data)
+            self._experience(pdf, user_data, keywords)
+            self._projects(pdf, user_data, keywords)
+            self._skills(pdf, user_data, keywords)
+            self._achievements(pdf, user_data)
+            self._paragraph_section(pdf, 'Языки', user_data.get('languages', ''))
+            self._paragraph_section(pdf, 'Интересы', user_data.get('interests', ''))
+            return bytes(pdf.output()), None
+        except Exception as e:
+            return None, f"Ошибка создания PDF: {str(e)}"
+
+    def warm_up(self):
+        """Подготовить урезанные шрифты заранее, до первого запроса"""
+        if self.available:
+            self._fonts()
+
+    def _fonts(self):
+        """Пути к шрифтам по начертаниям (урезанные копии, если удалось собрать)"""
+        if self._font_paths is not None:
+            return self._font_paths
+
+        paths = {}
+        regular = os.path.join(self.font_dir, self.FONT_FILES[''])
+        for style, name in self.FONT_FILES.items():
+            source = os.path.join(self.font_dir, name)
+            # Курсив есть не во всех сборках DejaVu - тогда обычное начертание
+            if not os.path.exists(source):
+                source = regular
+            paths[style] = self._subset_font(source)
+        self._font_paths = paths
+        return paths
+
+    def _subset_font(self, source):
+        target = os.path.join(self.cache_dir, os.path.basename(source))
+        if os.path.exists(target):
+            return target
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Предупреждения о служебных таблицах шрифта (FFTM) не важны
+            logging.getLogger('fontTools.subset').setLevel(logging.ERROR)
+            options = font_subset.Options()
+            options.layout_features = ['*']
+            options.name_IDs = ['*']
+            options.notdef_outline = True
+            font = TTFont(source)
+            subsetter = font_subset.Subsetter(options)
+            subsetter.populate(unicodes=self.UNICODES)
+            subsetter.subset(font)
+            # Атомарно: воркеры могут готовить шрифты одновременно
+            tmp_target = f"{target}.{os.getpid()}.tmp"
+            font.save(tmp_target)
+            os.replace(tmp_target, target)
+            return target
+        except Exception as e:
+            self.logger.warning("⚠️ Не удалось урезать шрифт %s: %s", source, e)
+            return source
+
+    def _new_document(self):
+        pdf = FPDF(unit='pt', format='letter')
+        pdf.set_margins(self.MARGIN, self.MARGIN, self.MARGIN)
+        pdf.set_auto_page_break(True, self.MARGIN)
+        for style, path in self._fonts().items():
+            pdf.add_font(self.FONT, style, path)
+        pdf.add_page()
+        return pdf
+
+    def _matcher(self, keywords):
+        key = tuple(str(kw) for kw in keywords)
+        matcher = self._matchers.get(key)
+        if matcher is None:
+            if len(self._matchers) >= 64:
+                self._matchers.clear()
+            variants = SKILL_TAXONOMY.variants(key)
+            matcher = SkillMatcher(variants, SKILL_TAXONOMY.exact_case(variants))
+            self._matchers[key] = matcher
+        return matcher
+
+    def _header(self, pdf, data):
+        pdf.set_font(self.FONT, 'B', 22)
+        pdf.cell(0, 26, data.get('full_name', 'Ваше Имя'), align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        contacts = [data.get('phone', '+7 999 999-99-99'), data.get('email', 'email@example.com')]
+        if data.get('location'):
+            contacts.append(data['location'])
+        pdf.set_font(self.FONT, '', 9.5)
+        pdf.cell(0, self.LINE, '  |  '.join(contacts), align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+        links = []
+        for field, title in (('linkedin', 'LinkedIn'), ('github', 'GitHub'), ('gitlab', 'GitLab'), ('portfolio', 'Portfolio')):
+            if data.get(field):
+                url = data[field].replace('https://', '').replace('http://', '')
+                links.append((title, 'https://' + url))
+        if links:
+            separator = '  |  '
+            width = sum(pdf.get_string_width(title) for title, _ in links)
+            width += pdf.get_string_width(separator) * (len(links) - 1)
+            pdf.set_x((pdf.w - width) / 2)
+            for i, (title, url) in enumerate(links):
+                if i:
+                    pdf.set_font(self.FONT, '', 9.5)
+                    pdf.cell(pdf.get_string_width(separator), self.LINE, separator)
+                pdf.set_font(self.FONT, 'U', 9.5)
+                pdf.cell(pdf.get_string_width(title), self.LINE, title, link=url)
+            pdf.set_font(self.FONT, '', 9.5)
+            pdf.ln(self.LINE)
+
+    def _section_title(self, pdf, title):
+        pdf.ln(6)
+        pdf.set_font(self.FONT, '', 13)
+        pdf.cell(0, 16, title.upper(), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        y = pdf.get_y()
+        pdf.set_line_width(0.5)
+        pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+        pdf.ln(3)
+
+    def _subheading(self, pdf, left, right, sub_left='', sub_right=''):
+        y = pdf.get_y()
+        pdf.set_font(self.FONT, 'B', 10.5)
+        pdf.cell(0, self.LINE, left)
+        pdf.set_xy(pdf.l_margin, y)
+        pdf.set_font(self.FONT, '', 10.5)
+        pdf.cell(0, self.LINE, right, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        if sub_left or sub_right:
+            y = pdf.get_y()
+            pdf.set_font(self.FONT, 'I', 9.5)
+            pdf.cell(0, self.LINE, sub_left)
+            pdf.set_xy(pdf.l_margin, y)
+            pdf.cell(0, self.LINE, sub_right, align='R', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+    def _rich_text(self, pdf, text, keywords=None, first_only=True, size=9.5):
+        """Текст с переносами; найденные ключевые слова - полужирным"""
+        spans = self._matcher(keywords).find(text, first_only) if keywords else []
+        pos = 0
+        for start, end, _ in spans:
+            pdf.set_font(self.FONT, '', size)
+            pdf.write(self.LINE, text[pos:start])
+            pdf.set_font(self.FONT, 'B', size)
+            pdf.write(self.LINE, text[start:end])
+            pos = end
+        pdf.set_font(self.FONT, '', size)
+        pdf.write(self.LINE, text[pos:])
+
+    def _bullets(self, pdf, text, keywords=None):
+        items = [line.strip().lstrip('-•').strip() for line in (text or '').split('\n')]
+        indent = pdf.l_margin + 14
+        for item in items:
+            if not item:
+                continue
+            pdf.set_font(self.FONT, '', 9.5)
+            pdf.set_x(indent - 9)
+            pdf.cell(9, self.LINE, '•')
+            pdf.set_left_margin(indent)
+            self._rich_text(pdf, item, keywords)
+            pdf.set_left_margin(self.MARGIN)
+            pdf.ln(self.LINE)
+        pdf.ln(2)
+
+    def _all_keywords(self, keywords):
+        if not keywords:
+            return None
+        return list(keywords.get('technical', [])) + list(keywords.get('keywords', []))
+
+    def _education(self, pdf, data):
+        educations = data.get('educations', [])
+        if not educations:
+            if not data.get('university'):
+                return
+            educations = [{
+                'university': data.get('university', ''),
+                'degree': data.get('degree', ''),
+                'study_period': data.get('study_period', '')
+            }]
+        entries = [edu or {} for edu in educations]
+        entries = [edu for edu in entries if any(edu.get(k) for k in ('university', 'degree', 'study_period'))]
+        if not entries:
+            return
+        self._section_title(pdf, 'Образование')
+        for edu in entries:
+            self._subheading(pdf, edu.get('university', ''), edu.get('study_period', ''), edu.get('degree', ''))
+
+    def _experience(self, pdf, data, keywords):
+        experiences = data.get('experiences', [])
+        if not experiences:
+            return
+        self._section_title(pdf, 'Опыт работы')
+        all_keywords = self._all_keywords(keywords)
+        for exp in experiences:
+            self._subheading(pdf, exp.get('position', ''), exp.get('work_period', ''), exp.get('company', ''))
+            self._bullets(pdf, exp.get('responsibilities', ''), all_keywords)
+
+    def _projects(self, pdf, data, keywords):
+        projects = data.get('projects', [])
+        if not projects:
+            return
+        self._section_title(pdf, 'Проекты')
+        all_keywords = self._all_keywords(keywords)
+        for proj in projects:
+            self._subheading(pdf, proj.get('project_name', ''), proj.get('period', ''))
+            self._bullets(pdf, proj.get('project_description', ''), all_keywords)
+
+    def _skills(self, pdf, data, keywords):
+        tech_skills = data.get('technical_skills', '')
+        soft_skills = data.get('soft_skills', '')
+        if not tech_skills:
+            return
+        self._section_title(pdf, 'Навыки')
+        pdf.set_font(self.FONT, 'B', 9.5)
+        pdf.write(self.LINE, 'Технические навыки: ')
+        technical = keywords.get('technical') if keywords else None
+        self._rich_text(pdf, tech_skills, technical, first_only=False)
+        pdf.ln(self.LINE)
+        if soft_skills:
+            pdf.set_font(self.FONT, 'B', 9.5)
+            pdf.write(self.LINE, 'Soft skills: ')
+            self._rich_text(pdf, soft_skills)
+            pdf.ln(self.LINE)
+
+    def _achievements(self, pdf, data):
+        achievements = data.get('achievements', '')
+        if not achievements:
+            return
+        self._section_title(pdf, 'Достижения')
+        for line in achievements.split('\n'):
+            item = line.strip().lstrip('-•').strip()
+            if item:
+                self._rich_text(pdf, item)
+                pdf.ln(self.LINE)
+
+    def _paragraph_section(self, pdf, title, text):
+        if not text:
+            return
+        self._section_title(pdf, title)
+        self._rich_text(pdf, text)
+        pdf.ln(self.LINE)
@@ -0,0 +1,155 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+import config
+
+
+class PdfCache:
+    """Кэш готовых PDF, адресуемый хэшем итогового LaTeX.
+
+    Два уровня: LRU в памяти (ограничен суммарным размером в байтах) и
+    каталог на диске, из которого при переполнении удаляются файлы
+    с самым старым временем последнего обращения. Одинаковый .tex при той же
+    версии шаблона дает тот же ключ, поэтому pdflatex не запускается повторно.
+    """
+
+    def __init__(self, cache_dir=None, memory_limit=None, disk_limit=None):
+        self.cache_dir = cache_dir or config.PDF_CACHE_DIR
+        self.memory_limit = memory_limit if memory_limit is not None else config.PDF_CACHE_MEMORY_BYTES
+        self.disk_limit = disk_limit if disk_limit is not None else config.PDF_CACHE_DISK_BYTES
+        self.memory = OrderedDict()
+        self.memory_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.disk_bytes = sum(size for _, size, _ in self._disk_entries())
+
+    @staticmethod
+    def make_key(latex_content, template_version):
+        digest = hashlib.sha256()
+        digest.update(template_version.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(latex_content.encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """PDF по ключу или None"""
+        with self._lock:
+            pdf_data = self.memory.get(key)
+            if pdf_data is not None:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return pdf_data
+
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                pdf_data = f.read()
+            # Время обращения для вытеснения с диска
+            os.utime(path)
+        except OSError:
+            pdf_data = None
+
+        with self._lock:
+            if not pdf_data:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._put_memory(key, pdf_data)
+        return pdf_data
+
+    def put(self, key, pdf_data):
+        if not pdf_data:
+            return
+        with self._lock:
+            self._put_memory(key, pdf_data)
+
+        path = self._path(key)
+        if os.path.exists(path):
+            return
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(pdf_data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning("⚠️ Не удалось сохранить PDF в кэш: %s", e)
+            return
+
+        with self._lock:
+            self.disk_bytes += len(pdf_data)
+            over_limit = self.disk_bytes > self.disk_limit
+        if over_limit:
+            self._evict_disk()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0,
+                'memory_entries': len(self.memory),
+                'memory_bytes': self.memory_bytes,
+                'disk_bytes': self.disk_bytes,
+                'evictions': self.evictions
+            }
+
+    def _put_memory(self, key, pdf_data):
+        if len(pdf_data) > self.memory_limit:
+            return
+        previous = self.memory.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= len(previous)
+        self.memory[key] = pdf_data
+        self.memory_bytes += len(pdf_data)
+        while self.memory_bytes > self.memory_limit:
+            _, old = self.memory.popitem(last=False)
+            self.memory_bytes -= len(old)
+            self.evictions += 1
+
+    def _evict_disk(self):
+        """Удалить самые давно использованные файлы до 90% лимита"""
+        entries = sorted(self._disk_entries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.disk_limit * 0.9
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self.disk_bytes = total
+            self.evictions += removed
+
+    def _disk_entries(self):
+        entries = []
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.pdf'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + '.pdf')
@@ -0,0 +1,97 @@
+import io
+import logging
+import re
+import threading
+
+import config
+
+try:
+    import pikepdf
+    PIKEPDF_AVAILABLE = True
+except ImportError:
+    PIKEPDF_AVAILABLE = False
+
+
+class PdfOptimizer:
+    """Уменьшение PDF перед отправкой в Telegram (pikepdf/qpdf).
+
+    Удаляет неиспользуемые ресурсы страниц, пережимает потоки (flate),
+    упаковывает объекты в object streams и линеаризует файл. Шрифты
+    pdflatex и fpdf2 уже встраивают подмножествами; полные шрифты только
+    учитываются в метриках. Если результат не меньше исходного, остается
+    исходный PDF.
+    """
+
+    SUBSET_PREFIX_RE = re.compile(r'^/?[A-Z]{6}\+')
+
+    def __init__(self, enabled=None):
+        self.enabled = (enabled if enabled is not None else config.PDF_OPTIMIZE) and PIKEPDF_AVAILABLE
+        self.optimized = 0
+        self.skipped = 0
+        self.failed = 0
+        self.bytes_before = 0
+        self.bytes_after = 0
+        self.full_fonts = 0
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def optimize(self, pdf_data):
+        """Оптимизированный PDF (или исходный, если оптимизация не помогла)"""
+        if not self.enabled or not pdf_data:
+            return pdf_data
+        try:
+            with pikepdf.open(io.BytesIO(pdf_data)) as pdf:
+                pdf.remove_unreferenced_resources()
+                full_fonts = self._count_full_fonts(pdf)
+                output = io.BytesIO()
+                pdf.save(
+                    output,
+                    compress_streams=True,
+                    recompress_flate=True,
+                    object_stream_mode=pikepdf.ObjectStreamMode.generate,
+                    linearize=True,
+                    # Одинаковый вход - одинаковый выход (повторная отправка по file_id)
+                    deterministic_id=True
+                )
+                result = output.getvalue()
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+            self.logger.warning("⚠️ Не удалось оптимизировать PDF: %s", e)
+            return pdf_data
+
+        with self._lock:
+            self.full_fonts += full_fonts
+            if len(result) >= len(pdf_data):
+                self.skipped += 1
+                self.bytes_before += len(pdf_data)
+                self.bytes_after += len(pdf_data)
+                return pdf_data
+            self.optimized += 1
+            self.bytes_before += len(pdf_data)
+            self.bytes_after += len(result)
+        return result
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'optimized': self.optimized,
+                'skipped': self.skipped,
+                'failed': self.failed,
+                'bytes_before': self.bytes_before,
+                'bytes_after': self.bytes_after,
+                'saved_ratio': 1 - self.bytes_after / self.bytes_before if self.bytes_before else 0,
+                'full_fonts': self.full_fonts
+            }
+
+    def _count_full_fonts(self, pdf):
+        """Встроенные шрифты без префикса подмножества (ABCDEF+Name)"""
+        count = 0
+        for obj in pdf.objects:
+            if not isinstance(obj, pikepdf.Dictionary) or obj.get('/Type') != '/FontDescriptor':
+                continue
+            embedded = any(key in obj for key in ('/FontFile', '/FontFile2', '/FontFile3'))
+            if embedded and not self.SUBSET_PREFIX_RE.match(str(obj.get('/FontName', ''))):
+                count += 1
+        return count
@@ -0,0 +1,193 @@
+import asyncio
+import copy
+import logging
+import os
+
+import config
+from latex_generator import LaTeXGenerator
+from pdf_cache import PdfCache
+from pdf_optimizer import PdfOptimizer
+from tex_engines import BENCHMARK_SAMPLE, benchmark_engines
+from tex_workers import TexWorkerPool
+
+
+class RenderQueueFull(Exception):
+    """Очередь рендера переполнена"""
+
+
+class RenderService:
+    """Пул TeX-воркеров для компиляции PDF с ограниченной очередью.
+
+    Обработчики ставят задачу через render() и дожидаются результата,
+    не блокируя event loop. Если очередь заполнена, render() сразу
+    выбрасывает RenderQueueFull. Отмена ожидающей корутины снимает задачу
+    из очереди, а уже запущенную компиляцию прерывает перезапуском воркера.
+    LaTeX генерируется в основном процессе; если такой PDF уже есть
+    в кэше, компиляция не запускается вовсе.
+
+    Бэкенд выбирается на запрос: 'latex' (pdflatex, высокое качество) или
+    'native' (fpdf2 без TeX, для превью). При переполненной очереди TeX
+    резюме рендерится через native, если он доступен и разрешен.
+    Готовый PDF проходит PdfOptimizer до записи в кэш.
+    """
+
+    def __init__(self, workers=None, queue_size=None, job_timeout=None, generator=None, cache=None,
+                 backend=None, native_fallback=None, optimizer=None):
+        self.generator = generator or LaTeXGenerator()
+        self.native = self.generator.native
+        self.cache = cache or PdfCache()
+        self.optimizer = optimizer or PdfOptimizer()
+        self.backend = backend or config.RENDER_BACKEND
+        self.native_fallback = native_fallback if native_fallback is not None else config.RENDER_NATIVE_FALLBACK
+        self.engine = self.generator.engine.name
+        self.engine_timings = {}
+        self.workers = workers or config.RENDER_WORKERS
+        self.queue_size = queue_size or config.RENDER_QUEUE_SIZE
+        self.job_timeout = job_timeout or config.RENDER_JOB_TIMEOUT
+        self.queue = None
+        self.pool = None
+        self.active_jobs = 0
+        self.completed_jobs = 0
+        self.failed_jobs = 0
+        self.native_jobs = 0
+        self.fallback_jobs = 0
+        self._consumers = []
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.queue_size)
+        if config.TEX_ENGINE == 'auto':
+            await self.select_engine()
+        # Воркеры поднимаются и прогревают кэши TeX до начала опроса Telegram
+        self.pool = TexWorkerPool(self.workers, self.engine)
+        await self.pool.start()
+        await asyncio.to_thread(self.native.warm_up)
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        self.logger.info("🖨 Рендер запущен: %s воркеров, очередь %s", self.workers, self.queue_size)
+
+    async def select_engine(self):
+        """Замерить доступные движки на примере резюме и выбрать самый быстрый"""
+        results_path = os.path.join(self.generator.cache_dir, 'engine_benchmark.json')
+        self.engine, self.engine_timings = await asyncio.to_thread(
+            benchmark_engines,
+            lambda name: LaTeXGenerator(cache_dir=self.generator.cache_dir, engine=name),
+            BENCHMARK_SAMPLE,
+            results_path=results_path
+        )
+        # LaTeX для воркеров генерируется здесь: преамбула должна подходить выбранному движку
+        self.generator.set_engine(self.engine)
+        self.logger.info("⏱ Выбран движок TeX: %s (%s)", self.engine, self.engine_timings)
+
+    async def stop(self):
+        for task in self._consumers:
+            task.cancel()
+        await asyncio.gather(*self._consumers, return_exceptions=True)
+        self._consumers = []
+        if self.pool:
+            await self.pool.stop()
+            self.pool = None
+
+    @property
+    def queue_depth(self):
+        return self.queue.qsize() if self.queue else 0
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'engine': self.engine,
+            'queued': self.queue_depth,
+            'active': self.active_jobs,
+            'completed': self.completed_jobs,
+            'failed': self.failed_jobs,
+            'restarts': self.pool.restarts if self.pool else 0,
+            'cache': self.cache.stats(),
+            'optimizer': self.optimizer.stats(),
+            'fragment_hits': self.generator.fragment_hits,
+            'fragment_misses': self.generator.fragment_misses,
+            'native': self.native_jobs,
+            'fallback': self.fallback_jobs
+        }
+
+    async def render(self, user_data, keywords=None, timeout=None, backend=None):
+        """Поставить резюме в очередь и дождаться (pdf_data, error)"""
+        if self.queue is None:
+            raise RuntimeError("RenderService не запущен")
+        if (backend or self.backend) == 'native' and self.native.available:
+            return await self._render_native(user_data, keywords)
+
+        latex_content = self.generator.generate_resume(user_data, keywords)
+        template = self.generator.templates.get(user_data.get('template_id'))
+        # Один LaTeX у xelatex, lualatex и tectonic дает разные PDF: движок входит в ключ
+        key = PdfCache.make_key(latex_content, f'{self.engine}-{template.version}')
+        pdf_data = await asyncio.to_thread(self.cache.get, key)
+        if pdf_data:
+            return pdf_data, None
+
+        result = asyncio.get_running_loop().create_future()
+        job = (latex_content, key, timeout or self.job_timeout, result)
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            if self.native_fallback and self.native.available:
+                self.fallback_jobs += 1
+                self.logger.info("🖨 Очередь TeX заполнена (%s), рендер через native", self.queue_depth)
+                return await self._render_native(user_data, keywords)
+            raise RenderQueueFull(f"В очереди {self.queue_depth} задач")
+
+        try:
+            return await result
+        except asyncio.CancelledError:
+            result.cancel()
+            raise
+
+    async def _render_native(self, user_data, keywords):
+        key = PdfCache.make_key(self.native.cache_source(user_data, keywords), f'native-{self.native.VERSION}')
+        pdf_data = await asyncio.to_thread(self.cache.get, key)
+        if pdf_data:
+            return pdf_data, None
+
+        self.native_jobs += 1
+        # Снимок: обработчики продолжают менять сессию, пока идет рендер
+        snapshot = copy.deepcopy(user_data), copy.deepcopy(keywords)
+        pdf_data, error = await asyncio.to_thread(self.native.render, *snapshot)
+        if pdf_data:
+            pdf_data = await asyncio.to_thread(self.optimizer.optimize, pdf_data)
+            await asyncio.to_thread(self.cache.put, key, pdf_data)
+        return pdf_data, error
+
+    async def _consume(self):
+        while True:
+            latex_content, key, timeout, result = await self.queue.get()
+            try:
+                if result.done():
+                    continue
+                self.active_jobs += 1
+                try:
+                    # Небольшой запас: pdflatex сам прерывается по тому же таймауту
+                    run = asyncio.ensure_future(self.pool.run((latex_content, timeout), timeout + 5))
+                    await asyncio.wait({run, result}, return_when=asyncio.FIRST_COMPLETED)
+                    if not run.done():
+                        # Пользователь ушел: прерываем компиляцию
+                        run.cancel()
+                        await asyncio.gather(run, return_exceptions=True)
+                        continue
+                    outcome = run.result()
+                    if outcome[0]:
+                        outcome = (await asyncio.to_thread(self.optimizer.optimize, outcome[0]), outcome[1])
+                except TimeoutError:
+                    outcome = (None, "Timeout компиляции")
+                except Exception as e:
+                    self.logger.error("❌ Ошибка воркера рендера: %s", e)
+                    outcome = (None, f"Ошибка рендера: {e}")
+                finally:
+                    self.active_jobs -= 1
+
+                if not result.done():
+                    result.set_result(outcome)
+                if outcome[0]:
+                    self.completed_jobs += 1
+                    await asyncio.to_thread(self.cache.put, key, outcome[0])
+                else:
+                    self.failed_jobs += 1
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,74 @@
+import hashlib
+import re
+import unicodedata
+
+import config
+from ttl_cache import TtlCache
+
+
+def normalize_text(text):
+    """Нормализация ответа пользователя для ключа кэша: NFC, пробелы, пустые строки"""
+    text = unicodedata.normalize('NFC', text or '')
+    lines = [re.sub(r'\s+', ' ', line).strip() for line in text.split('\n')]
+    return '\n'.join(line for line in lines if line)
+
+
+class RewriteCache(TtlCache):
+    """Кэш переформулировок AI: LRU в памяти поверх SQLite.
+
+    Ключ - поле, нормализованный текст и модель. Записи старше TTL
+    считаются промахом и удаляются; на диске хранится не больше
+    max_entries записей (вытесняются давно не использованные).
+    Для каждой записи запоминается время ответа модели, чтобы считать
+    сэкономленное на попаданиях время.
+    """
+
+    TABLE = 'rewrites'
+    VALUE_COLUMN = 'result'
+    LABEL = 'кэша переформулировок'
+
+    def __init__(self, path=None, capacity=None, ttl=None, max_entries=None):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        super().__init__(
+            path or config.AI_CACHE_DB_PATH,
+            capacity or config.AI_CACHE_SIZE,
+            ttl if ttl is not None else config.AI_CACHE_TTL,
+            max_entries or config.AI_CACHE_MAX_ENTRIES
+        )
+
+    @staticmethod
+    def make_key(field_key, text, model_name):
+        payload = '\0'.join([field_key or '', model_name or '', normalize_text(text)])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """Сохраненная переформулировка или None"""
+        with self._lock:
+            entry, from_memory = self._lookup(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if from_memory:
+                self.memory_hits += 1
+            else:
+                self.disk_hits += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def put(self, key, result, latency):
+        self._store(key, result, latency)
+
+    def stats(self):
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_ratio': hits / lookups if lookups else 0,
+                'saved_seconds': round(self.saved_seconds, 2),
+                'memory_entries': len(self.hot)
+            }
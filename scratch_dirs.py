@@ -0,0 +1,87 @@
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import config
+
+
+def scratch_root():
+    """Каталог для временных файлов компиляции: tmpfs, если есть место, иначе диск"""
+    candidates = [config.SCRATCH_ROOT] if config.SCRATCH_ROOT else ['/dev/shm']
+    for path in candidates:
+        if _has_room(path):
+            return path
+    return tempfile.gettempdir()
+
+
+def _has_room(path):
+    try:
+        return os.access(path, os.W_OK) and shutil.disk_usage(path).free >= config.SCRATCH_MIN_FREE_BYTES
+    except OSError:
+        return False
+
+
+class ScratchDirPool:
+    """Заранее созданные рабочие каталоги компиляции, переиспользуемые между задачами.
+
+    Каталоги живут в base_dir (по умолчанию - на /dev/shm); после задачи
+    каталог очищается, но не удаляется. Если свободных каталогов нет или
+    в RAM закончилось место, выдается обычный временный каталог на диске.
+    """
+
+    def __init__(self, base_dir=None, size=2):
+        self.owned = base_dir is None
+        self.base_dir = base_dir or tempfile.mkdtemp(prefix='resume-scratch-', dir=scratch_root())
+        self.reused = 0
+        self.fallbacks = 0
+        self._free = []
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+        for i in range(size):
+            path = os.path.join(self.base_dir, f'job-{i}')
+            os.makedirs(path, exist_ok=True)
+            self._free.append(path)
+        if self.owned:
+            atexit.register(self.close)
+
+    @contextmanager
+    def acquire(self):
+        """Чистый рабочий каталог на время одной компиляции"""
+        with self._lock:
+            path = self._free.pop() if self._free and _has_room(self.base_dir) else None
+        if path is None:
+            self.fallbacks += 1
+            with tempfile.TemporaryDirectory() as tmpdir:
+                yield tmpdir
+            return
+
+        self.reused += 1
+        try:
+            yield path
+        finally:
+            # Остатки прошлой задачи (в том числе старый resume.pdf) не должны
+            # попасть в следующую: неочищенный каталог в пул не возвращается
+            if self._clean(path):
+                with self._lock:
+                    self._free.append(path)
+
+    def close(self):
+        if self.owned:
+            shutil.rmtree(self.base_dir, ignore_errors=True)
+
+    def _clean(self, path):
+        try:
+            for entry in os.scandir(path):
+                if entry.is_dir(follow_symlinks=False):
+                    shutil.rmtree(entry.path)
+                else:
+                    os.unlink(entry.path)
+            return True
+        except OSError as e:
+            self.logger.warning("⚠️ Не удалось очистить %s: %s", path, e)
+            return False
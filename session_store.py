@@ -0,0 +1,208 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import config
+
+
+class SessionStore:
+    """Хранилище сессий: LRU в памяти поверх локального SQLite (WAL).
+
+    Горячие сессии живут в памяти и изменяются обработчиками на месте.
+    Вытесненные из LRU и измененные с последнего flush() сессии
+    записываются в SQLite, поэтому после рестарта они поднимаются локально,
+    без запроса в Google Sheets. Сессии, простаивающие дольше TTL, удаляются.
+
+    Сессия, которую держит обработчик (in_use), не вытесняется: иначе
+    следующая загрузка из SQLite создала бы новый dict, и правки старого
+    потерялись бы. Вытесненная сессия до записи в flush() остается в
+    памяти, и get() возвращает тот же объект.
+
+    Обращения к SQLite (get() мимо памяти, write_rows(), expire()) из
+    event loop нужно выполнять в потоке; cached() и dirty_rows() диск не
+    трогают.
+    """
+
+    def __init__(self, path=None, capacity=None, ttl=None):
+        self.path = path or config.SESSION_DB_PATH
+        self.capacity = capacity or config.SESSION_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else config.SESSION_TTL
+        self.hot = OrderedDict()
+        self.last_access = {}
+        self._touched = set()
+        # Вытесненные из LRU и еще не записанные сессии
+        self._evicted = {}
+        # user_id -> число обработчиков, которые держат сессию
+        self._in_use = {}
+        self._lock = threading.RLock()
+        self.logger = logging.getLogger(__name__)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS sessions ('
+            'user_id INTEGER PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        self.conn.commit()
+
+    def cached(self, user_id, default=None):
+        """Сессия пользователя из памяти, без обращения к SQLite"""
+        with self._lock:
+            now = time.time()
+            session = self.hot.get(user_id)
+            if session is not None:
+                self.hot.move_to_end(user_id)
+                self.last_access[user_id] = now
+                self._touched.add(user_id)
+                return session
+            session = self._evicted.pop(user_id, None)
+            if session is not None:
+                self._put_hot(user_id, session, now)
+                return session
+            return default
+
+    def get(self, user_id, default=None):
+        """Сессия пользователя из памяти или из SQLite"""
+        with self._lock:
+            session = self.cached(user_id)
+            if session is not None:
+                return session
+
+            now = time.time()
+            row = self.conn.execute(
+                'SELECT data, updated_at FROM sessions WHERE user_id = ?', (user_id,)
+            ).fetchone()
+            if not row:
+                return default
+            data, updated_at = row
+            if self.ttl and now - updated_at > self.ttl:
+                self._delete_cold(user_id)
+                return default
+            try:
+                session = json.loads(data)
+            except ValueError:
+                self._delete_cold(user_id)
+                return default
+            self._put_hot(user_id, session, now)
+            return session
+
+    def put(self, user_id, session):
+        with self._lock:
+            self._put_hot(user_id, session, time.time())
+
+    def __contains__(self, user_id):
+        return self.get(user_id) is not None
+
+    def __getitem__(self, user_id):
+        session = self.get(user_id)
+        if session is None:
+            raise KeyError(user_id)
+        return session
+
+    def __setitem__(self, user_id, session):
+        self.put(user_id, session)
+
+    def __len__(self):
+        return len(self.hot)
+
+    @contextmanager
+    def in_use(self, user_id):
+        """Удерживать сессию в памяти, пока обработчик с ней работает"""
+        with self._lock:
+            self._in_use[user_id] = self._in_use.get(user_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_use[user_id] -= 1
+                if not self._in_use[user_id]:
+                    del self._in_use[user_id]
+
+    def dirty_rows(self):
+        """Строки для SQLite: сессии, к которым обращались с прошлого раза, и
+        вытесненные. Сериализуются в потоке вызывающего (event loop), где
+        обработчики меняют сессии."""
+        with self._lock:
+            rows = []
+            for user_id in self._touched:
+                session = self.hot.get(user_id)
+                if session is not None:
+                    rows.append(self._row(user_id, session))
+            for user_id, session in self._evicted.items():
+                rows.append(self._row(user_id, session))
+                if user_id not in self.hot:
+                    self.last_access.pop(user_id, None)
+            self._touched.clear()
+            self._evicted.clear()
+            return rows
+
+    def write_rows(self, rows):
+        if rows:
+            with self._lock:
+                self._write_cold(rows)
+        return len(rows)
+
+    def flush(self):
+        """Записать в SQLite сессии, к которым обращались с прошлого flush()"""
+        return self.write_rows(self.dirty_rows())
+
+    def expire(self):
+        """Удалить сессии, простаивающие дольше TTL"""
+        if not self.ttl:
+            return 0
+        with self._lock:
+            deadline = time.time() - self.ttl
+            stale = [
+                uid for uid, ts in self.last_access.items()
+                if ts < deadline and uid not in self._in_use
+            ]
+            for user_id in stale:
+                self.hot.pop(user_id, None)
+                self._evicted.pop(user_id, None)
+                self.last_access.pop(user_id, None)
+                self._touched.discard(user_id)
+            cursor = self.conn.execute('DELETE FROM sessions WHERE updated_at < ?', (deadline,))
+            self.conn.commit()
+            return len(stale) + cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self._touched.update(self.hot.keys())
+            self.flush()
+            self.conn.close()
+
+    def _put_hot(self, user_id, session, now):
+        self.hot[user_id] = session
+        self.hot.move_to_end(user_id)
+        self.last_access[user_id] = now
+        self._touched.add(user_id)
+
+        # Вытесняются самые старые из незанятых; запись в SQLite - при flush()
+        excess = len(self.hot) - self.capacity
+        if excess > 0:
+            idle = [uid for uid in self.hot if uid not in self._in_use][:excess]
+            for old_id in idle:
+                self._evicted[old_id] = self.hot.pop(old_id)
+                self._touched.discard(old_id)
+
+    def _row(self, user_id, session):
+        updated_at = self.last_access.get(user_id, time.time())
+        return user_id, json.dumps(session, ensure_ascii=False, default=str), updated_at
+
+    def _write_cold(self, rows):
+        try:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO sessions (user_id, data, updated_at) VALUES (?, ?, ?)', rows
+            )
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.error("❌ Не удалось сохранить сессии в SQLite: %s", e)
+
+    def _delete_cold(self, user_id):
+        self.conn.execute('DELETE FROM sessions WHERE user_id = ?', (user_id,))
+        self.conn.commit()
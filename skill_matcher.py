@@ -0,0 +1,72 @@
+import re
+
+
+class SkillMatcher:
+    """Поиск всех навыков словаря в тексте за один проход.
+
+    variants - варианты написания (строки или словарь вариант -> навык).
+    Словарь компилируется один раз в регулярное выражение-альтернацию,
+    длинные варианты раньше коротких: совпадения не пересекаются, в каждой
+    позиции выбирается самое длинное ("REST API", а не "REST"). Регистр не
+    важен, кроме вариантов из exact_case: они ищутся только в переданном
+    написании. Вариант не должен примыкать к буквам и цифрам, поэтому C и R
+    не находятся внутри слов, а C++ и C# находятся.
+    """
+
+    def __init__(self, variants, exact_case=()):
+        if not isinstance(variants, dict):
+            variants = {variant: variant for variant in variants}
+        exact_case = set(exact_case)
+        self.variants = {}
+        spellings = {}
+        for variant, value in variants.items():
+            if variant:
+                self.variants.setdefault(variant.lower(), value)
+                spellings.setdefault(variant.lower(), set()).add(variant)
+
+        def alternative(variant):
+            if spellings[variant] <= exact_case:
+                return '(?-i:' + '|'.join(re.escape(spelling) for spelling in sorted(spellings[variant])) + ')'
+            return re.escape(variant)
+
+        ordered = sorted(self.variants, key=len, reverse=True)
+        self.pattern = re.compile(
+            r'(?<!\w)(?:' + '|'.join(alternative(variant) for variant in ordered) + r')(?!\w)',
+            re.IGNORECASE
+        ) if ordered else None
+
+    def __bool__(self):
+        return self.pattern is not None
+
+    def find(self, text, first_only=False):
+        """Совпадения слева направо: (начало, конец, навык); first_only - не больше
+        одного совпадения на каждый навык"""
+        if self.pattern is None or not text:
+            return []
+        spans = []
+        used = set()
+        for match in self.pattern.finditer(text):
+            value = self.variants.get(match.group().lower())
+            if value is None or (first_only and value in used):
+                continue
+            spans.append((match.start(), match.end(), value))
+            used.add(value)
+        return spans
+
+    def values(self, text):
+        """Найденные навыки в порядке первого упоминания"""
+        return list(dict.fromkeys(value for _, _, value in self.find(text)))
+
+    def highlight(self, text, before, after, first_only=False):
+        """Обернуть найденные варианты в before/after"""
+        spans = self.find(text, first_only)
+        if not spans:
+            return text
+        parts = []
+        pos = 0
+        for start, end, _ in spans:
+            parts.append(text[pos:start])
+            parts.append(before + text[start:end] + after)
+            pos = end
+        parts.append(text[pos:])
+        return ''.join(parts)
@@ -0,0 +1,89 @@
+import json
+import logging
+from collections import namedtuple
+
+import config
+from skill_matcher import SkillMatcher
+
+Skill = namedtuple('Skill', ['name', 'category', 'group'])
+
+
+class SkillTaxonomy:
+    """Словарь навыков: вариант написания -> канонический навык и категория.
+
+    Загружается из versioned JSON (skills_taxonomy.json) один раз при старте;
+    все варианты всех навыков компилируются в один SkillMatcher. Один и тот
+    же индекс используют поиск навыков без AI, проверка ответа Gemini и
+    подсветка ключевых слов в резюме, поэтому "Golang" в вакансии и "Go"
+    в резюме считаются одним навыком везде.
+
+    Короткие варианты (Go, C, R, JS, ML) совпадают с обычными словами и
+    частями текста ("go-to", "r&d"), поэтому ищутся только в написании
+    из словаря; остальные - без учета регистра.
+    """
+
+    SHORT_VARIANT_LEN = 2
+
+    def __init__(self, skills=(), version=0):
+        self.version = version
+        self.skills = {}
+        self.index = {}
+        # Вариант в нижнем регистре -> написание из словаря
+        self.spellings = {}
+        self.logger = logging.getLogger(__name__)
+
+        for entry in skills:
+            skill = Skill(entry['name'], entry.get('category', 'technical'), entry.get('group', ''))
+            if skill.name in self.skills:
+                self.logger.warning("⚠️ Навык %s описан в словаре дважды", skill.name)
+                continue
+            self.skills[skill.name] = skill
+            for variant in (skill.name, *entry.get('synonyms', ())):
+                owner = self.index.setdefault(variant.lower(), skill.name)
+                if owner != skill.name:
+                    self.logger.warning("⚠️ Вариант %s уже относится к навыку %s", variant, owner)
+                    continue
+                self.spellings.setdefault(variant.lower(), variant)
+
+        variants = {self.spellings[variant]: name for variant, name in self.index.items()}
+        self.matcher = SkillMatcher(variants, self.exact_case(variants))
+
+    @classmethod
+    def load(cls, path=None):
+        """Словарь из JSON; при ошибке - пустой словарь (поиск без AI ничего не найдет)"""
+        path = path or config.SKILLS_TAXONOMY_PATH
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            return cls(data['skills'], data.get('version', 0))
+        except (OSError, ValueError, KeyError) as e:
+            logging.getLogger(__name__).error("❌ Не удалось загрузить словарь навыков %s: %s", path, e)
+            return cls()
+
+    def canonical(self, name):
+        """Каноническое имя навыка или None, если навыка нет в словаре"""
+        return self.index.get((name or '').strip().lower())
+
+    def find(self, text):
+        """Канонические навыки из текста в порядке первого упоминания"""
+        return self.matcher.values(text)
+
+    def variants(self, names):
+        """Вариант написания -> навык для набора навыков (для подсветки).
+        Навыки не из словаря ищутся как есть."""
+        wanted = {}
+        for name in names:
+            name = str(name)
+            wanted.setdefault(self.canonical(name) or name, name)
+        variants = {self.spellings[variant]: wanted[skill] for variant, skill in self.index.items() if skill in wanted}
+        for name in wanted:
+            if name not in self.skills:
+                variants.setdefault(name, wanted[name])
+        return variants
+
+    def exact_case(self, variants):
+        """Варианты, которые ищутся только с учетом регистра (короткие)"""
+        return {variant for variant in variants if len(variant) <= self.SHORT_VARIANT_LEN}
+
+
+SKILL_TAXONOMY = SkillTaxonomy.load()
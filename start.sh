@@ -5,7 +5,7 @@ echo "🔧 Installing LaTeX..."
 
 # Обновляем apt и устанавливаем texlive
 apt-get update
-apt-get install -y texlive-latex-base texlive-fonts-recommended texlive-fonts-extra texlive-latex-extra texlive-lang-cyrillic
+apt-get install -y texlive-latex-base texlive-fonts-recommended texlive-fonts-extra texlive-latex-extra texlive-lang-cyrillic fonts-dejavu-core
 
 echo "✅ LaTeX installed"
 echo "🚀 Starting bot..."
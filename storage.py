@@ -0,0 +1,103 @@
+import asyncio
+import copy
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import config
+
+
+class AsyncDatabase:
+    """Асинхронный фасад над Database.
+
+    Все обращения к Google Sheets выполняются в отдельном ограниченном пуле
+    потоков, поэтому медленный запрос не блокирует event loop бота.
+    Каждый метод принимает необязательный timeout (в секундах); при его
+    истечении возвращается то же значение, что и при ошибке в Database.
+    Если передан writer (WriteBehindQueue), записи ставятся в его очередь
+    и не ждут Sheets, а чтение видит еще не записанные строки.
+    """
+
+    def __init__(self, db, writer=None, max_workers=None, timeout=None):
+        self.db = db
+        self.writer = writer
+        self.timeout = timeout if timeout is not None else config.STORAGE_TIMEOUT
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or config.STORAGE_WORKERS,
+            thread_name_prefix='sheets'
+        )
+        # Фоновые записи без writer: ссылки держим до завершения, иначе задачу
+        # может собрать GC, а ошибка записи не попадет в лог
+        self._background = set()
+        self.logger = logging.getLogger(__name__)
+
+    async def _call(self, func, *args, timeout=None, default=None):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, functools.partial(func, *args))
+        deadline = timeout if timeout is not None else self.timeout
+        try:
+            return await asyncio.wait_for(future, deadline)
+        except asyncio.TimeoutError:
+            self.logger.warning("⚠️ Таймаут Sheets (%s c) в %s", deadline, func.__name__)
+            return default
+
+    async def get_user_data(self, user_id, timeout=None):
+        if self.writer:
+            pending = self.writer.pending_user_row(user_id)
+            if pending:
+                return self.db.parse_user_row(pending)
+        return await self._call(self.db.get_user_data, user_id, timeout=timeout)
+
+    def queue_user_data(self, user_id, username, data):
+        """Неблокирующая запись строки пользователя"""
+        if self.writer:
+            return self.writer.queue_user_data(user_id, username, data)
+        self._spawn(self.save_user_data(user_id, username, data), 'save_user_data')
+        return True
+
+    def queue_feedback(self, user_id, username, feedback_data, user_data=None):
+        """Неблокирующая запись обратной связи (и строки пользователя с ней)"""
+        if self.writer:
+            return self.writer.queue_feedback(user_id, username, feedback_data, user_data)
+        self._spawn(self.save_feedback(user_id, username, feedback_data, user_data), 'save_feedback')
+        return True
+
+    def _spawn(self, coro, name):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(functools.partial(self._background_done, name))
+
+    def _background_done(self, name, task):
+        self._background.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            self.logger.error("❌ Фоновая запись в Sheets (%s) упала: %s", name, exc)
+        elif task.result() is False:
+            self.logger.error("❌ Фоновая запись в Sheets (%s) не удалась", name)
+
+    async def save_user_data(self, user_id, username, data, timeout=None):
+        # Снимок сессии: обработчики продолжают менять её, пока идет запись
+        snapshot = copy.deepcopy(data)
+        return await self._call(
+            self.db.save_user_data, user_id, username, snapshot,
+            timeout=timeout, default=False
+        )
+
+    async def save_feedback(self, user_id, username, feedback_data, user_data=None, timeout=None):
+        snapshot = copy.deepcopy(feedback_data)
+        user_snapshot = copy.deepcopy(user_data) if user_data is not None else None
+        return await self._call(
+            self.db.save_feedback, user_id, username, snapshot, user_snapshot,
+            timeout=timeout, default=False
+        )
+
+    async def update_analytics(self, force=False, timeout=None):
+        return await self._call(self.db.update_analytics, force, timeout=timeout, default=False)
+
+    async def analytics_metrics(self, timeout=None):
+        return await self._call(self.db.counters.metrics, timeout=timeout)
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
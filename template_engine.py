@@ -0,0 +1,72 @@
+import hashlib
+import re
+
+BEGIN_DOCUMENT = r'\begin{document}'
+
+
+def preamble_version(preamble):
+    """Короткий хэш преамбулы: по нему кэшируются формат и готовые PDF"""
+    return hashlib.sha1(preamble.encode('utf-8')).hexdigest()[:12]
+
+
+def split_preamble(latex_content):
+    """Преамбула документа (все до \\begin{document}) или None"""
+    idx = latex_content.find(BEGIN_DOCUMENT)
+    return latex_content[:idx] if idx >= 0 else None
+
+
+class CompiledTemplate:
+    """Шаблон, разобранный один раз на литералы и слоты вида {FULL_NAME}.
+
+    render() подставляет значения за один проход и склеивает части через
+    join, поэтому текст пользователя с '{EDUCATION_SECTION}' внутри
+    не подставляется повторно.
+    """
+
+    SLOT_RE = re.compile(r'\{([A-Z][A-Z_]*)\}')
+
+    def __init__(self, template_id, source):
+        self.template_id = template_id
+        self.source = source
+        self.preamble = split_preamble(source) or ''
+        self.version = preamble_version(self.preamble)
+
+        self._parts = []
+        self._slots = []
+        pos = 0
+        for match in self.SLOT_RE.finditer(source):
+            self._parts.append(source[pos:match.start()])
+            self._slots.append((len(self._parts), match.group(1)))
+            self._parts.append('')
+            pos = match.end()
+        self._parts.append(source[pos:])
+
+    @property
+    def slot_names(self):
+        return {name for _, name in self._slots}
+
+    def render(self, values):
+        parts = list(self._parts)
+        for index, name in self._slots:
+            parts[index] = values.get(name, '')
+        return ''.join(parts)
+
+
+class TemplateRegistry:
+    """Набор скомпилированных шаблонов по template_id из сессии"""
+
+    def __init__(self, default_id):
+        self.default_id = default_id
+        self.templates = {}
+
+    def register(self, template_id, source):
+        template = CompiledTemplate(template_id, source)
+        self.templates[template_id] = template
+        return template
+
+    def get(self, template_id=None):
+        """Шаблон по id; неизвестный id - шаблон по умолчанию"""
+        return self.templates.get(template_id) or self.templates[self.default_id]
+
+    def __iter__(self):
+        return iter(self.templates.values())
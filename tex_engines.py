@@ -0,0 +1,182 @@
+import json
+import logging
+import os
+import re
+import shutil
+import time
+
+
+class TexEngine:
+    """Движок TeX: команда запуска, окружение и разбор лога.
+
+    Подклассы задают бинарник и опции. supports_format - умеет ли движок
+    компилировать с заранее собранным форматом преамбулы (mylatexformat).
+    unicode - движок читает UTF-8 и OpenType-шрифты сам (XeTeX, LuaTeX):
+    inputenc и T2A из шаблона ему не подходят, кириллицу дает fontspec.
+    """
+
+    name = None
+    binary = None
+    options = ('-interaction=nonstopmode', '-file-line-error')
+    supports_format = False
+    unicode = False
+
+    # Строки шаблона, рассчитанные на pdflatex (8-битные кодировки)
+    LEGACY_FONT_RE = re.compile(r'^[ \t]*\\usepackage(?:\[[^\]]*\])?\{(?:inputenc|fontenc)\}[ \t]*\n', re.M)
+    # Шрифт с кириллицей берется файлами из каталога, а не из системы:
+    # так его находят и xelatex, и lualatex, и tectonic. Курсива в
+    # fonts-dejavu-core нет - \textit останется прямым, без ошибки
+    FONTSPEC_SETUP = (
+        '    \\usepackage{{fontspec}}\n'
+        '    \\setmainfont{{DejaVuSerif}}[Path={font_dir}/, Extension=.ttf, BoldFont=*-Bold]\n'
+    )
+
+    ERROR_LINE_RE = re.compile(r'^(?:!|\S+\.tex:\d+:)')
+    MISSING_CHAR_RE = re.compile(r'Missing character: There is no (.+?) in font')
+
+    def available(self):
+        return shutil.which(self.binary) is not None
+
+    def prepare_template(self, source, font_dir):
+        """Шаблон под движок: для Unicode-движков inputenc/fontenc заменяются на fontspec"""
+        if not self.unicode:
+            return source
+        match = self.LEGACY_FONT_RE.search(source)
+        if match is None:
+            return source
+        setup = self.FONTSPEC_SETUP.format(font_dir=font_dir.rstrip('/'))
+        return source[:match.start()] + setup + self.LEGACY_FONT_RE.sub('', source[match.start():])
+
+    def command(self, tex_file, output_dir, format_name=None):
+        command = [self.binary, *self.options]
+        if format_name and self.supports_format:
+            command.append(f'-fmt={format_name}')
+        return command + ['-output-directory', output_dir, tex_file]
+
+    def parse_errors(self, log_text, stdout='', stderr=''):
+        """Строки ошибок из лога (последняя - самая информативная)"""
+        return [line.strip() for line in log_text.splitlines() if self.ERROR_LINE_RE.match(line.strip())]
+
+    def missing_characters(self, log_text):
+        """Символы, для которых в шрифте не нашлось глифов (потеря качества)"""
+        return self.MISSING_CHAR_RE.findall(log_text)
+
+
+class PdfLatexEngine(TexEngine):
+    name = 'pdflatex'
+    binary = 'pdflatex'
+    supports_format = True
+
+
+class XeLatexEngine(TexEngine):
+    name = 'xelatex'
+    binary = 'xelatex'
+    unicode = True
+
+
+class LuaLatexEngine(TexEngine):
+    name = 'lualatex'
+    binary = 'lualatex'
+    unicode = True
+
+
+class TectonicEngine(TexEngine):
+    """Tectonic: XeTeX с автоматической загрузкой пакетов и повторными прогонами"""
+
+    name = 'tectonic'
+    binary = 'tectonic'
+    unicode = True
+    options = ('--keep-logs', '--chatter', 'minimal')
+
+    def command(self, tex_file, output_dir, format_name=None):
+        return [self.binary, *self.options, '--outdir', output_dir, tex_file]
+
+    def parse_errors(self, log_text, stdout='', stderr=''):
+        errors = super().parse_errors(log_text)
+        errors += [line.strip() for line in stderr.splitlines() if line.strip().startswith('error:')]
+        return errors
+
+
+# Пример резюме для замера: все секции и кириллица
+BENCHMARK_SAMPLE = {
+    'full_name': 'Иван Петров',
+    'email': 'ivan@example.com',
+    'phone': '+7 900 000-00-00',
+    'location': 'Москва',
+    'github': 'github.com/ivan',
+    'educations': [{'university': 'МГУ им. Ломоносова', 'degree': 'Бакалавр, ПМИ', 'study_period': '2016 -- 2020'}],
+    'experiences': [{
+        'position': 'Backend-разработчик',
+        'company': 'ООО «Ромашка»',
+        'work_period': '2020 -- н.в.',
+        'responsibilities': 'Разработка сервисов на Python и PostgreSQL\nУскорил отчеты в 3 раза (кэш, индексы)'
+    }],
+    'projects': [{'project_name': 'Telegram-бот', 'period': '2024', 'project_description': 'Генерация резюме в PDF'}],
+    'technical_skills': 'Python, SQL, Docker, Git',
+    'soft_skills': 'Коммуникация, наставничество',
+    'achievements': 'Призер хакатона 2023',
+    'languages': 'Русский (родной), English (B2)',
+    'interests': 'Шахматы, бег'
+}
+
+ENGINES = {
+    engine.name: engine for engine in (PdfLatexEngine, XeLatexEngine, LuaLatexEngine, TectonicEngine)
+}
+
+
+def get_engine(name):
+    """Движок по имени; неизвестное имя - pdflatex"""
+    return ENGINES.get(name, PdfLatexEngine)()
+
+
+def available_engines():
+    return [engine for engine in (cls() for cls in ENGINES.values()) if engine.available()]
+
+
+def benchmark_engines(generator_factory, sample, runs=2, timeout=120, results_path=None):
+    """Скомпилировать пример резюме каждым доступным движком и замерить время.
+
+    generator_factory(engine_name) возвращает LaTeXGenerator для движка.
+    Первый прогон прогревает кэши (и собирает формат), в зачет идет лучший
+    из остальных. Движок проходит по качеству, если PDF собрался без
+    ошибок и без пропавших символов. Возвращает (имя лучшего, замеры).
+    """
+    logger = logging.getLogger(__name__)
+    results = {}
+    for engine in available_engines():
+        generator = generator_factory(engine.name)
+        latex_content = generator.generate_resume(sample)
+        pdf_data, error = generator.compile_pdf(latex_content, timeout=timeout)
+        timings = []
+        for _ in range(max(runs - 1, 1)):
+            if not pdf_data:
+                break
+            started = time.perf_counter()
+            pdf_data, error = generator.compile_pdf(latex_content, timeout=timeout)
+            timings.append(time.perf_counter() - started)
+
+        missing = generator.last_missing_characters
+        errors = generator.last_errors
+        if not error and errors:
+            error = errors[-1]
+        if not error and missing:
+            error = f"нет символов: {', '.join(missing[:5])}"
+        results[engine.name] = {
+            'seconds': round(min(timings), 3) if timings and pdf_data else None,
+            'ok': bool(pdf_data) and not errors and not missing,
+            'error': error
+        }
+        logger.info("⏱ %s: %s", engine.name, results[engine.name])
+
+    passed = [(result['seconds'], name) for name, result in results.items() if result['ok']]
+    best = min(passed)[1] if passed else PdfLatexEngine.name
+
+    if results_path:
+        try:
+            os.makedirs(os.path.dirname(results_path), exist_ok=True)
+            with open(results_path, 'w', encoding='utf-8') as f:
+                json.dump({'best': best, 'engines': results, 'measured_at': time.time()},
+                          f, ensure_ascii=False, indent=2)
+        except OSError as e:
+            logger.warning("⚠️ Не удалось сохранить замеры движков: %s", e)
+    return best, results
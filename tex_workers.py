@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+from multiprocessing.connection import Connection
+
+from latex_generator import LaTeXGenerator
+from scratch_dirs import scratch_root
+
+
+def _worker_main(conn, work_dir, engine):
+    """Цикл долгоживущего воркера: принимает готовый LaTeX по pipe и компилирует PDF.
+
+    Генератор, собранный формат преамбулы, каталоги TEXMFVAR/TEXMFCONFIG и
+    рабочие каталоги компиляции (в work_dir, по возможности в RAM) живут
+    все время работы процесса, поэтому кэши TeX остаются теплыми.
+    """
+    os.makedirs(os.path.join(work_dir, 'texmf'), exist_ok=True)
+    generator = LaTeXGenerator(
+        texmf_dir=os.path.join(work_dir, 'texmf'),
+        engine=engine,
+        scratch_dir=os.path.join(work_dir, 'jobs')
+    )
+    generator.warm_up()
+    conn.send(('ready', None))
+
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            return
+        if job is None:
+            return
+        latex_content, timeout = job
+        try:
+            result = generator.compile_pdf(latex_content, timeout=timeout)
+        except Exception as e:
+            result = (None, f"Ошибка рендера: {e}")
+        try:
+            conn.send(('done', result))
+        except (EOFError, OSError):
+            return
+
+
+class TexWorker:
+    """Один процесс-воркер с pipe для задач.
+
+    Воркер запускается как отдельная программа (fork + exec этого файла),
+    а не через multiprocessing: fork многопоточного процесса бота может
+    зависнуть на чужих блокировках, а spawn/forkserver заново импортируют
+    bot.py (подключение к Sheets, свой рендер) в каждом воркере.
+    """
+
+    START_TIMEOUT = 180
+
+    def __init__(self, engine=None):
+        self.engine = engine
+        self.process = None
+        self.conn = None
+        self.work_dir = None
+        self.jobs_done = 0
+
+    def start(self):
+        # Каталог создает и удаляет родитель: после SIGKILL воркера в /dev/shm
+        # ничего не остается
+        self.work_dir = tempfile.mkdtemp(prefix='tex-worker-', dir=scratch_root())
+        parent_conn, child_conn = multiprocessing.Pipe()
+        try:
+            # Своя группа процессов: при перезапуске убиваем и зависший pdflatex
+            self.process = subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), str(child_conn.fileno()),
+                 self.work_dir, self.engine or ''],
+                pass_fds=(child_conn.fileno(),),
+                start_new_session=True
+            )
+        finally:
+            child_conn.close()
+        self.conn = parent_conn
+        # Ждем, пока воркер соберет/найдет формат преамбулы
+        if not parent_conn.poll(self.START_TIMEOUT):
+            raise TimeoutError("TeX-воркер не запустился")
+        parent_conn.recv()
+
+    def call(self, job, timeout):
+        """Отправить задачу и дождаться результата (блокирующий вызов)"""
+        conn = self.conn
+        conn.send(job)
+        if not conn.poll(timeout):
+            raise TimeoutError("TeX-воркер не ответил вовремя")
+        _, result = conn.recv()
+        self.jobs_done += 1
+        return result
+
+    def is_alive(self):
+        return bool(self.process and self.process.poll() is None)
+
+    def terminate(self):
+        """Убить процесс вместе с его группой (включая запущенный pdflatex)"""
+        if self.process and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                self.process.kill()
+            self._wait(5)
+
+    def _wait(self, timeout):
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            pass
+
+    def kill(self):
+        self.terminate()
+        if self.conn:
+            self.conn.close()
+        if self.work_dir:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+        self.process = None
+        self.conn = None
+        self.work_dir = None
+
+    def restart(self):
+        self.kill()
+        self.start()
+
+    def stop(self):
+        if self.conn:
+            try:
+                self.conn.send(None)
+            except (EOFError, OSError):
+                pass
+        if self.process:
+            self._wait(2)
+        self.kill()
+
+
+class TexWorkerPool:
+    """Пул долгоживущих TeX-воркеров с автоматическим перезапуском.
+
+    Воркер, упавший или не уложившийся в таймаут, убивается вместе
+    с дочерним pdflatex и запускается заново.
+    """
+
+    def __init__(self, size, engine=None):
+        self.size = size
+        self.engine = engine
+        self.workers = []
+        self.idle = None
+        self.restarts = 0
+        self.logger = logging.getLogger(__name__)
+
+    async def start(self):
+        self.idle = asyncio.Queue()
+        for _ in range(self.size):
+            worker = TexWorker(self.engine)
+            await asyncio.to_thread(worker.start)
+            self.workers.append(worker)
+            self.idle.put_nowait(worker)
+
+    async def stop(self):
+        for worker in self.workers:
+            await asyncio.to_thread(worker.stop)
+        self.workers = []
+
+    async def run(self, job, timeout):
+        """Выполнить задачу на свободном воркере и вернуть (pdf_data, error)"""
+        worker = await self.idle.get()
+        call = None
+        try:
+            if not worker.is_alive():
+                await self._restart(worker, "процесс завершился")
+            call = asyncio.ensure_future(asyncio.to_thread(worker.call, job, timeout))
+            return await asyncio.shield(call)
+        except asyncio.CancelledError:
+            # Результат больше не нужен: прерываем компиляцию, воркер
+            # вернется в пул после перезапуска
+            worker.terminate()
+            asyncio.ensure_future(self._recover(worker, call))
+            worker = None
+            raise
+        except (TimeoutError, EOFError, OSError) as e:
+            await self._restart(worker, e)
+            raise
+        finally:
+            if worker is not None:
+                self.idle.put_nowait(worker)
+
+    async def _restart(self, worker, reason):
+        self.restarts += 1
+        self.logger.warning("🔁 Перезапуск TeX-воркера: %s", reason)
+        await asyncio.to_thread(worker.restart)
+
+    async def _recover(self, worker, call):
+        if call is not None:
+            await asyncio.gather(call, return_exceptions=True)
+        try:
+            await self._restart(worker, "задача отменена")
+        except Exception as e:
+            self.logger.error("❌ Не удалось перезапустить TeX-воркер: %s", e)
+        self.idle.put_nowait(worker)
+
+
+if __name__ == '__main__':
+    _worker_main(Connection(int(sys.argv[1])), sys.argv[2], sys.argv[3] or None)
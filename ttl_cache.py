@@ -0,0 +1,130 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TtlCache:
+    """Кэш ответов: LRU в памяти поверх SQLite (WAL) с TTL.
+
+    Записи старше TTL считаются промахом и удаляются; на диске хранится не
+    больше max_entries записей (вытесняются давно не использованные). Для
+    каждой записи запоминается время получения значения (latency), чтобы
+    считать сэкономленное на попаданиях время.
+
+    Подклассы задают таблицу (TABLE, VALUE_COLUMN), подпись для логов
+    (LABEL) и счетчики попаданий поверх _lookup()/_store().
+    """
+
+    TABLE = None
+    VALUE_COLUMN = 'value'
+    LABEL = 'кэша'
+
+    def __init__(self, path, capacity, ttl, max_entries):
+        self.path = path
+        self.capacity = capacity
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hot = OrderedDict()
+        self.saved_seconds = 0.0
+        self._inserts = 0
+        self._lock = threading.RLock()
+        self.logger = logging.getLogger(type(self).__module__)
+
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self._create_tables()
+        self.conn.commit()
+
+    def _create_tables(self):
+        self.conn.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.TABLE} ('
+            f'key TEXT PRIMARY KEY, {self.VALUE_COLUMN} TEXT NOT NULL, latency REAL NOT NULL, '
+            'created_at REAL NOT NULL, accessed_at REAL NOT NULL)'
+        )
+        self.conn.execute(f'CREATE INDEX IF NOT EXISTS {self.TABLE}_accessed ON {self.TABLE} (accessed_at)')
+
+    def expire(self):
+        """Удалить записи старше TTL"""
+        if not self.ttl:
+            return 0
+        with self._lock:
+            deadline = time.time() - self.ttl
+            for key in [key for key, entry in self.hot.items() if entry[2] < deadline]:
+                del self.hot[key]
+            cursor = self.conn.execute(f'DELETE FROM {self.TABLE} WHERE created_at < ?', (deadline,))
+            self._expire_extra(deadline)
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _lookup(self, key):
+        """(запись, из памяти ли) или (None, False); запись - (значение, latency, created_at).
+        Вызывается под self._lock."""
+        now = time.time()
+        entry = self.hot.get(key)
+        if entry is not None and not self._expired(entry[2], now):
+            self.hot.move_to_end(key)
+            return entry, True
+        self.hot.pop(key, None)
+
+        try:
+            row = self.conn.execute(
+                f'SELECT {self.VALUE_COLUMN}, latency, created_at FROM {self.TABLE} WHERE key = ?', (key,)
+            ).fetchone()
+            if row and self._expired(row[2], now):
+                self.conn.execute(f'DELETE FROM {self.TABLE} WHERE key = ?', (key,))
+                self.conn.commit()
+                row = None
+            if row:
+                self.conn.execute(f'UPDATE {self.TABLE} SET accessed_at = ? WHERE key = ?', (now, key))
+                self.conn.commit()
+        except sqlite3.Error as e:
+            self.logger.warning("⚠️ Ошибка чтения %s: %s", self.LABEL, e)
+            row = None
+
+        if not row:
+            return None, False
+        self._put_hot(key, row)
+        return tuple(row), False
+
+    def _store(self, key, value, latency):
+        now = time.time()
+        with self._lock:
+            self._put_hot(key, (value, latency, now))
+            try:
+                self.conn.execute(
+                    f'INSERT OR REPLACE INTO {self.TABLE} '
+                    f'(key, {self.VALUE_COLUMN}, latency, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)',
+                    (key, value, latency, now, now)
+                )
+                self._inserts += 1
+                if self._inserts % 100 == 0:
+                    self._prune()
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.logger.warning("⚠️ Не удалось сохранить запись %s: %s", self.LABEL, e)
+
+    def _put_hot(self, key, entry):
+        self.hot[key] = tuple(entry)
+        self.hot.move_to_end(key)
+        while len(self.hot) > self.capacity:
+            self.hot.popitem(last=False)
+
+    def _expired(self, created_at, now):
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _prune(self):
+        self.conn.execute(
+            f'DELETE FROM {self.TABLE} WHERE key IN ('
+            f'SELECT key FROM {self.TABLE} ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
+
+    def _expire_extra(self, deadline):
+        """Дополнительная очистка подкласса при expire() (под self._lock)"""
@@ -0,0 +1,76 @@
+import asyncio
+
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Параллельная обработка апдейтов разных пользователей, но строго по
+    очереди для одного пользователя.
+
+    PTB предупреждает, что ConversationHandler нужно использовать с
+    выключенным concurrent_updates: два апдейта одного чата, обработанные
+    одновременно, читают одно и то же состояние диалога, и переход одного
+    из них теряется (то же с правками сессии). Состояние диалога и сессия
+    здесь хранятся по пользователю, поэтому достаточно, чтобы апдейты
+    одного пользователя не пересекались: они выполняются по очереди в
+    порядке поступления, а параллельно идут только разные пользователи.
+
+    Лимит PTB (process_update помечен @final) ограничивает только число
+    апдейтов в работе вместе с ожидающими очереди пользователя (max_pending).
+    Одновременно обрабатывается не больше max_concurrent_updates: слот
+    берется уже после очереди пользователя, поэтому ждущие апдейты одного
+    активного пользователя не занимают слоты остальных.
+
+    on_wait(update) вызывается, если апдейт встал в очередь за предыдущим
+    (например, чтобы /start отменил долгий AI-запрос). scope(update) -
+    контекстный менеджер на время обработки апдейта (например, удержание
+    сессии пользователя в памяти).
+    """
+
+    def __init__(self, max_concurrent_updates, on_wait=None, scope=None, max_pending=None):
+        super().__init__(max_pending or max_concurrent_updates * 16)
+        self.concurrent_limit = max_concurrent_updates
+        self.on_wait = on_wait
+        self.scope = scope
+        self._slots = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self._queues = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = self._key(update)
+        if key is None:
+            await self._run(update, coroutine)
+            return
+
+        entry = self._queues.setdefault(key, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            if entry[0].locked() and self.on_wait:
+                self.on_wait(update)
+            async with entry[0]:
+                await self._run(update, coroutine)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._queues.pop(key, None)
+
+    async def _run(self, update, coroutine):
+        async with self._slots:
+            if self.scope is None:
+                await coroutine
+                return
+            with self.scope(update):
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    @staticmethod
+    def _key(update):
+        user = getattr(update, 'effective_user', None)
+        if user is not None:
+            return ('user', user.id)
+        chat = getattr(update, 'effective_chat', None)
+        return ('chat', chat.id) if chat is not None else None
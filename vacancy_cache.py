@@ -0,0 +1,193 @@
+import hashlib
+import json
+import sqlite3
+import time
+from array import array
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import config
+from rewrite_cache import normalize_text
+from ttl_cache import TtlCache
+from vacancy_index import MinHashIndex, minhash_signature
+
+# Идентификаторы рекламных кликов: не влияют на содержимое страницы на любом сайте
+CLICK_ID_PARAMS = {'gclid', 'fbclid', 'yclid', 'ysclid', '_openstat'}
+# Параметры навигации hh.ru (откуда пришли, поисковый запрос); на других сайтах
+# такие имена могут выбирать страницу, поэтому убираются только на hh.ru
+HH_TRACKING_PARAMS = {'from', 'hhtmfrom', 'hhtmfromlabel', 'hhtmsource', 'query', 'ref', 'referrer', 'source'}
+
+
+def _is_tracking_param(name, hh):
+    name = name.lower()
+    if name == 'utm' or name.startswith('utm_') or name in CLICK_ID_PARAMS:
+        return True
+    return hh and name in HH_TRACKING_PARAMS
+
+
+def canonical_url(url):
+    """Каноническая ссылка на вакансию: без трекинга, якоря и региональных поддоменов hh.ru"""
+    parts = urlsplit((url or '').strip())
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    path = parts.path.rstrip('/') or '/'
+
+    # spb.hh.ru/vacancy/123?query=... и hh.ru/vacancy/123 - одна и та же вакансия
+    hh = host == 'hh.ru' or host.endswith('.hh.ru')
+    if hh:
+        segments = path.split('/')
+        if len(segments) > 2 and segments[1] == 'vacancy' and segments[2].isdigit():
+            return f'https://hh.ru/vacancy/{segments[2]}'
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not _is_tracking_param(name, hh)
+    )
+    netloc = host if not parts.port or parts.port in (80, 443) else f'{host}:{parts.port}'
+    return urlunsplit(('https', netloc, path, urlencode(query), ''))
+
+
+class VacancyCache(TtlCache):
+    """Кэш анализа вакансий: LRU в памяти поверх SQLite.
+
+    Две записи на вакансию: каноническая ссылка -> текст страницы (не нужно
+    скачивать ее снова) и отпечаток нормализованного текста с моделью ->
+    ключевые слова (не нужно снова спрашивать Gemini). Записи старше TTL
+    считаются промахом; на диске хранится не больше max_entries записей.
+
+    Для каждого разобранного текста сохраняется MinHash-подпись: слегка
+    измененная копия вакансии (другие пробелы, футер, трекинг) находится
+    через LSH-индекс, даже если точный отпечаток не совпал.
+    """
+
+    TABLE = 'vacancies'
+    LABEL = 'кэша вакансий'
+
+    def __init__(self, path=None, capacity=None, ttl=None, max_entries=None):
+        self.threshold = config.VACANCY_SIMILARITY_THRESHOLD
+        self.index = MinHashIndex(config.VACANCY_INDEX_SIZE)
+        self.hits = {'url': 0, 'text': 0, 'similar': 0}
+        self.misses = {'url': 0, 'text': 0, 'similar': 0}
+        super().__init__(
+            path or config.VACANCY_CACHE_DB_PATH,
+            capacity or config.VACANCY_CACHE_SIZE,
+            ttl if ttl is not None else config.VACANCY_CACHE_TTL,
+            max_entries or config.VACANCY_CACHE_MAX_ENTRIES
+        )
+        self._load_index()
+
+    def _create_tables(self):
+        super()._create_tables()
+        self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS vacancy_signatures ('
+            'key TEXT PRIMARY KEY, signature BLOB NOT NULL, created_at REAL NOT NULL)'
+        )
+
+    @staticmethod
+    def url_key(url):
+        return 'url:' + canonical_url(url)
+
+    @staticmethod
+    def text_key(text, model_name):
+        payload = '\0'.join([model_name or '', normalize_text(text)])
+        return 'text:' + hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get_text(self, url):
+        """Сохраненный текст вакансии по ссылке или None"""
+        return self._get(self.url_key(url), 'url')
+
+    def put_text(self, url, text, latency):
+        self._put(self.url_key(url), text, latency)
+
+    def get_keywords(self, text, model_name):
+        """Сохраненные ключевые слова для текста вакансии или None"""
+        value = self._get(self.text_key(text, model_name), 'text')
+        return json.loads(value) if value else None
+
+    def put_keywords(self, text, model_name, keywords, latency):
+        key = self.text_key(text, model_name)
+        self._put(key, json.dumps(keywords, ensure_ascii=False), latency)
+
+        signature = minhash_signature(text)
+        if signature is None:
+            return
+        now = time.time()
+        self.index.add(key, signature, now)
+        with self._lock:
+            try:
+                self.conn.execute(
+                    'INSERT OR REPLACE INTO vacancy_signatures (key, signature, created_at) VALUES (?, ?, ?)',
+                    (key, signature.tobytes(), now)
+                )
+                self.conn.commit()
+            except sqlite3.Error as e:
+                self.logger.warning("⚠️ Не удалось сохранить подпись вакансии: %s", e)
+
+    def get_similar_keywords(self, text):
+        """Ключевые слова почти такой же вакансии и оценка похожести или (None, 0)"""
+        signature = minhash_signature(text)
+        match = self.index.query(signature, self.threshold) if signature is not None else None
+        if match is None:
+            with self._lock:
+                self.misses['similar'] += 1
+            return None, 0
+        key, score = match
+        value = self._get(key, 'similar')
+        if not value:
+            # Запись вытеснена или устарела - подпись больше не нужна
+            self.index.remove(key)
+            return None, 0
+        return json.loads(value), score
+
+    def stats(self):
+        with self._lock:
+            hits = sum(self.hits.values())
+            lookups = hits + sum(self.misses.values())
+            return {
+                'url_hits': self.hits['url'],
+                'text_hits': self.hits['text'],
+                'similar_hits': self.hits['similar'],
+                'indexed': len(self.index),
+                'misses': sum(self.misses.values()),
+                'hit_ratio': hits / lookups if lookups else 0,
+                'saved_seconds': round(self.saved_seconds, 2),
+                'memory_entries': len(self.hot)
+            }
+
+    def _load_index(self):
+        """Подписи последних вакансий из SQLite в LSH-индекс"""
+        deadline = time.time() - self.ttl if self.ttl else 0
+        try:
+            rows = self.conn.execute(
+                'SELECT key, signature, created_at FROM vacancy_signatures WHERE created_at >= ? '
+                'ORDER BY created_at DESC LIMIT ?',
+                (deadline, self.index.capacity)
+            ).fetchall()
+        except sqlite3.Error as e:
+            self.logger.warning("⚠️ Не удалось загрузить подписи вакансий: %s", e)
+            return
+        for key, blob, created_at in reversed(rows):
+            signature = array('Q')
+            signature.frombytes(blob)
+            self.index.add(key, signature, created_at)
+
+    def _get(self, key, kind):
+        with self._lock:
+            entry, _ = self._lookup(key)
+            if entry is None:
+                self.misses[kind] += 1
+                return None
+            self.hits[kind] += 1
+            self.saved_seconds += entry[1]
+            return entry[0]
+
+    def _put(self, key, value, latency):
+        self._store(key, value, latency)
+
+    def _prune(self):
+        super()._prune()
+        self.conn.execute('DELETE FROM vacancy_signatures WHERE key NOT IN (SELECT key FROM vacancies)')
+
+    def _expire_extra(self, deadline):
+        self.index.expire(deadline)
+        self.conn.execute('DELETE FROM vacancy_signatures WHERE created_at < ?', (deadline,))
@@ -0,0 +1,120 @@
+import hashlib
+import re
+import threading
+from array import array
+
+from rewrite_cache import normalize_text
+
+NUM_HASHES = 128
+BAND_ROWS = 4
+SHINGLE_SIZE = 3
+# Короче этого сравнение по шинглам ненадежно - такие тексты не индексируются
+MIN_SHINGLES = 20
+
+HASH_BITS = 64
+BIN_SPAN = (1 << HASH_BITS) // NUM_HASHES
+WORD_RE = re.compile(r'\w+')
+
+
+def minhash_signature(text):
+    """MinHash-подпись текста вакансии или None, если текст слишком короткий.
+
+    Шинглы - тройки слов нормализованного текста. Подпись строится за один
+    проход (one permutation hashing): 64-битный хэш шингла попадает в одну
+    из NUM_HASHES корзин, в корзине остается минимум. Пустые корзины
+    заполняются значением ближайшей следующей непустой.
+    """
+    words = WORD_RE.findall(normalize_text(text).lower())
+    shingles = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)}
+    if len(shingles) < MIN_SHINGLES:
+        return None
+
+    empty = (1 << HASH_BITS) - 1
+    signature = array('Q', [empty]) * NUM_HASHES
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'big')
+        slot, offset = divmod(value, BIN_SPAN)
+        if offset < signature[slot]:
+            signature[slot] = offset
+
+    filled = [i for i in range(NUM_HASHES) if signature[i] != empty]
+    for i in range(NUM_HASHES):
+        if signature[i] == empty:
+            donor = next((j for j in filled if j > i), filled[0])
+            # Смещение по номеру корзины, чтобы заимствованные значения не совпадали случайно
+            signature[i] = signature[donor] + BIN_SPAN * ((donor - i) % NUM_HASHES)
+    return signature
+
+
+def similarity(first, second):
+    """Оценка коэффициента Жаккара по двум подписям"""
+    return sum(a == b for a, b in zip(first, second)) / NUM_HASHES
+
+
+class MinHashIndex:
+    """Индекс ранее разобранных вакансий для поиска почти дубликатов (LSH).
+
+    Подпись режется на полосы по BAND_ROWS значений; тексты с совпавшей
+    хотя бы одной полосой - кандидаты, из них выбирается самый похожий
+    по полной подписи. При 32 полосах по 4 строки текст с похожестью 0.8
+    находится почти наверняка, а с похожестью ниже 0.3 - почти никогда.
+    """
+
+    def __init__(self, capacity=5000):
+        self.capacity = capacity
+        self.entries = {}
+        self.buckets = {}
+        self._lock = threading.Lock()
+
+    def add(self, key, signature, created_at):
+        with self._lock:
+            self._remove(key)
+            while len(self.entries) >= self.capacity:
+                oldest = min(self.entries, key=lambda k: self.entries[k][1])
+                self._remove(oldest)
+            self.entries[key] = (signature, created_at)
+            for band in self._bands(signature):
+                self.buckets.setdefault(band, set()).add(key)
+
+    def query(self, signature, threshold):
+        """(ключ, похожесть) самого похожего текста не ниже порога или None"""
+        with self._lock:
+            candidates = set()
+            for band in self._bands(signature):
+                candidates |= self.buckets.get(band, set())
+            best = None
+            for key in candidates:
+                score = similarity(signature, self.entries[key][0])
+                if score >= threshold and (best is None or score > best[1]):
+                    best = (key, score)
+            return best
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def expire(self, deadline):
+        with self._lock:
+            for key in [key for key, entry in self.entries.items() if entry[1] < deadline]:
+                self._remove(key)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _remove(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return
+        for band in self._bands(entry[0]):
+            bucket = self.buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self.buckets[band]
+
+    @staticmethod
+    def _bands(signature):
+        return [
+            (start, signature[start:start + BAND_ROWS].tobytes())
+            for start in range(0, NUM_HASHES, BAND_ROWS)
+        ]
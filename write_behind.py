@@ -0,0 +1,141 @@
+import logging
+import threading
+
+import config
+
+
+class WriteBehindQueue:
+    """Отложенная запись в Google Sheets из фонового потока.
+
+    Строки пользователей объединяются по UserID (побеждает последняя версия),
+    строки обратной связи копятся в списке. Поток сбрасывает их пачкой
+    через batch_update/append_rows раз в interval секунд или раньше,
+    если накопилось max_pending записей. Ошибки повторяются с
+    экспоненциальной паузой в фоновом потоке, вызывающий код не ждет.
+    """
+
+    def __init__(self, db, interval=None, max_pending=None, max_backoff=None):
+        self.db = db
+        self.interval = interval or config.WRITE_BEHIND_INTERVAL
+        self.max_pending = max_pending or config.WRITE_BEHIND_MAX_PENDING
+        self.max_backoff = max_backoff or config.WRITE_BEHIND_MAX_BACKOFF
+        self.pending_users = {}
+        self.pending_feedback = []
+        self.failures = 0
+        self.flushed_requests = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self.logger = logging.getLogger(__name__)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='sheets-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=30):
+        """Остановить поток, предварительно сбросив все накопленное"""
+        self._stopping = True
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def queue_user_data(self, user_id, username, data):
+        """Поставить в очередь строку пользователя (снимок данных на момент вызова)"""
+        row = self.db.build_user_row(user_id, username, data)
+        with self._lock:
+            self.pending_users[str(user_id)] = row
+        self._maybe_wake()
+        return True
+
+    def queue_feedback(self, user_id, username, feedback_data, user_data=None):
+        """Поставить в очередь строку Feedback и, если передана сессия, строку пользователя"""
+        row = self.db.build_feedback_row(user_id, username, feedback_data)
+        with self._lock:
+            self.pending_feedback.append(row)
+        if user_data is not None:
+            user_data = dict(user_data, feedback=feedback_data)
+            return self.queue_user_data(user_id, username, user_data)
+        self._maybe_wake()
+        return True
+
+    def pending_user_row(self, user_id):
+        """Еще не записанная строка пользователя (для чтения своих записей)"""
+        with self._lock:
+            return self.pending_users.get(str(user_id))
+
+    def pending_count(self):
+        with self._lock:
+            return len(self.pending_users) + len(self.pending_feedback)
+
+    def flush(self):
+        """Записать все накопленное; при ошибке вернуть записи в очередь"""
+        with self._flush_lock:
+            with self._lock:
+                users, self.pending_users = self.pending_users, {}
+                feedback, self.pending_feedback = self.pending_feedback, []
+            if not users and not feedback:
+                return True
+
+            try:
+                if users:
+                    self._write_users(users)
+                    users = {}
+                if feedback:
+                    self.db.feedback_sheet.append_rows(feedback)
+                    self.flushed_requests += 1
+                    self.db.count_feedback_rows(feedback)
+                    feedback = []
+                self.failures = 0
+                return True
+            except Exception as e:
+                self.failures += 1
+                self.logger.warning("⚠️ Ошибка записи в Sheets (попытка %s): %s", self.failures, e)
+                with self._lock:
+                    # Более свежие версии строк, пришедшие во время записи, важнее
+                    for user_id, row in users.items():
+                        self.pending_users.setdefault(user_id, row)
+                    self.pending_feedback[:0] = feedback
+                return False
+
+    def _write_users(self, users):
+        rows = self.db._verified_rows(list(users.keys()))
+        end_col = self.db._column_letter(len(self.db.USERS_HEADERS))
+
+        updates = []
+        new_ids = []
+        for user_id, row_data in users.items():
+            row_num = rows.get(user_id)
+            if row_num:
+                updates.append({'range': f"A{row_num}:{end_col}{row_num}", 'values': [row_data]})
+            else:
+                new_ids.append(user_id)
+
+        if updates:
+            self.db.users_sheet.batch_update(updates)
+            self.flushed_requests += 1
+        if new_ids:
+            response = self.db.users_sheet.append_rows([users[user_id] for user_id in new_ids])
+            self.flushed_requests += 1
+            self.db._remember_rows(new_ids, response)
+        self.db.count_user_rows(users.values())
+
+    def _maybe_wake(self):
+        # Пока Sheets отвечает ошибками, ждем backoff, а не пишем на каждый новый апдейт
+        if not self.failures and self.pending_count() >= self.max_pending:
+            self._wake.set()
+
+    def _run(self):
+        while True:
+            delay = self.interval
+            if self.failures:
+                delay = min(self.max_backoff, self.interval * (2 ** self.failures))
+            self._wake.wait(delay)
+            self._wake.clear()
+            self.flush()
+            if self._stopping:
+                # Последняя попытка уже сделана выше
+                return